@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+# run_benchmarks.py - Measures how the scripts scale with the size of the library.
+# For every requested size it generates a synthetic library (synthlibrary.py), starts the local
+# stand-in server (standinserver.py) and runs each phase as its own process, answering the prompts
+# through stdin. Reported per phase: wall time, peak RSS of the process and API requests per endpoint,
+# plus the script's own breakdown into named steps (its --metrics-json output).
+#
+#   python benchmarks/run_benchmarks.py --sizes 10000 100000 500000 --latency 0.005
+
+import argparse, json, os, shutil, subprocess, sys, tempfile, time
+from synthlibrary import generate
+from standinserver import StandInServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs a script like `python script.py` would and writes the peak RSS of the process (in bytes) to a file.
+BOOTSTRAP = '''
+import os, runpy, sys
+script = sys.argv[1]; sys.argv = sys.argv[1:]
+sys.path.insert(0, os.path.dirname(script))
+try: runpy.run_path(script, run_name='__main__')
+finally:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != 'darwin': peak *= 1024
+    except ImportError: peak = 0
+    with open(os.environ['BENCH_PEAK_RSS_FILE'], 'w') as f: f.write(str(peak))
+'''
+
+def phases(folder):
+    """(name, script, stdin) of every benchmarked phase, in the order they have to run."""
+    m3u_folder, db_path = os.path.join(folder, 'm3u'), os.path.join(folder, 'navidrome.db')
+    return [
+        ('itunestoND', 'itunestoND.py', 'y\n'),
+        ('playlist-migrator', 'itunesPlaylistMigrator.py', 'yes\n'),
+        ('pipeline', 'itunesPipeline.py', ''),  # Both of the above in one pass, without prompts
+        ('checker-search', 'playlisttools.py', f'1\n{m3u_folder}\n1\n4\n5\n'),
+        ('checker-catalogue', 'playlisttools.py', f'1\n{m3u_folder}\n2\n4\n5\n'),
+        ('checker-database', 'playlisttools.py', f'1\n{m3u_folder}\n3\n{db_path}\n4\n5\n'),
+    ]
+
+def run_phase(folder, name, script, stdin, server):
+    """Runs one phase in `folder` (where its config.json lives). Returns the phase's result dict."""
+    rss_file, metrics_file = os.path.join(folder, f'{name}.rss'), os.path.join(folder, f'{name}.metrics.json')
+    env = dict(os.environ, BENCH_PEAK_RSS_FILE=rss_file, PYTHONPATH=REPO_DIR)
+    server.request_counts(reset=True)
+    started = time.perf_counter()
+    with open(os.path.join(folder, f'{name}.log'), 'w', encoding='utf-8') as log:
+        process = subprocess.run([sys.executable, '-c', BOOTSTRAP, os.path.join(REPO_DIR, script), '--metrics-json', metrics_file], cwd=folder, env=env,
+                                 input=stdin, text=True, stdout=log, stderr=subprocess.STDOUT)
+    wall = time.perf_counter() - started
+    peak_rss = 0
+    if os.path.exists(rss_file):
+        with open(rss_file) as f: peak_rss = int(f.read() or 0)
+    steps = []
+    if os.path.exists(metrics_file):
+        with open(metrics_file) as f: steps = json.load(f)['phases']
+    requests = server.request_counts(reset=True)
+    return {'phase': name, 'ok': process.returncode == 0, 'wall_seconds': round(wall, 3), 'peak_rss_bytes': peak_rss,
+            'requests': sum(requests.values()), 'requests_by_endpoint': requests, 'steps': steps}
+
+def run_size(track_count, latency, workdir, selected_phases):
+    folder = os.path.join(workdir, f'library-{track_count}')
+    print(f'\n=== {track_count:,} tracks ===')
+    shutil.rmtree(folder, ignore_errors=True)  # Checkpoints and caches of an earlier run would skew the numbers.
+    started = time.perf_counter()
+    summary = generate(folder, track_count)
+    results = [{'phase': 'generate', 'ok': True, 'wall_seconds': round(time.perf_counter() - started, 3), 'peak_rss_bytes': 0,
+                'requests': 0, 'requests_by_endpoint': {}, **summary}]
+    print(f"Generated {summary['tracks']:,} tracks and {summary['playlists']:,} playlists ({summary['playlist_entries']:,} entries) "
+          f"in {results[0]['wall_seconds']:.1f}s")
+
+    server = StandInServer(os.path.join(folder, 'navidrome.db'), latency).start()
+    try:
+        with open(os.path.join(folder, 'config.json')) as f: config = json.load(f)
+        config.update({'server_url': server.url, 'navidrome_url': server.url})
+        with open(os.path.join(folder, 'config.json'), 'w') as f: json.dump(config, f, indent=4)
+        for name, script, stdin in phases(folder):
+            if selected_phases and name not in selected_phases: continue
+            result = run_phase(folder, name, script, stdin, server)
+            results.append(result)
+            print_result(result)
+    finally: server.stop()
+    return results
+
+def print_result(result):
+    status = '' if result['ok'] else '  FAILED (see the phase log)'
+    peak = f"{result['peak_rss_bytes'] / 2**20:8.1f} MB" if result['peak_rss_bytes'] else '       n/a'
+    endpoints = ', '.join(f'{endpoint} {count:,}' for endpoint, count in sorted(result['requests_by_endpoint'].items()))
+    print(f"  {result['phase']:<20} {result['wall_seconds']:9.2f} s  {peak}  {result['requests']:>9,} requests{status}")
+    if endpoints: print(f"  {'':<20} {endpoints}")
+    steps = ', '.join(f"{step['phase']} {step['seconds']:.2f}s" for step in result.get('steps', []) if step['seconds'] >= 0.01)
+    if steps: print(f"  {'':<20} {steps}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the migration scripts against synthetic libraries.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000], help='numbers of tracks to test')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds the stand-in server adds to every request')
+    parser.add_argument('--phases', nargs='+', help='only run these phases (see phases())')
+    parser.add_argument('--workdir', help='where the libraries are generated (default: a temporary folder)')
+    parser.add_argument('--keep', action='store_true', help='keep the generated files and phase logs')
+    parser.add_argument('--json', help='also write all results to this JSON file')
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='navidrome-bench-')
+    print(f'Working in {workdir} (stand-in latency {args.latency * 1000:.1f} ms per request)')
+    all_results = {}
+    try:
+        for track_count in args.sizes: all_results[track_count] = run_size(track_count, args.latency, workdir, args.phases)
+    finally:
+        if not args.keep and not args.workdir: shutil.rmtree(workdir, ignore_errors=True)
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(all_results, f, indent=4)
+        print(f'\nResults written to {args.json}')
+    if not all(result['ok'] for results in all_results.values() for result in results): sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+# standinserver.py - A small local stand-in for a Navidrome server, used by the benchmarks.
+# It serves the songs of a (synthetic) navidrome.db through the handful of Subsonic endpoints the
+# scripts use, keeps playlists in memory, adds a configurable latency to every request and counts
+# the requests per endpoint, so the network side of each phase can be measured without a real server.
+
+import argparse, itertools, json, re, sqlite3, threading, time
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+WORD = re.compile(r'\w+')
+
+class StandInState:
+    """Songs, playlists and request counters shared by all request handler threads."""
+
+    def __init__(self, navidrome_db, latency=0.0, form_post=True):
+        self.latency, self.form_post = latency, form_post
+        conn = sqlite3.connect(navidrome_db)
+        columns = ('id', 'title', 'artist', 'album', 'path', 'duration')
+        self.songs = [dict(zip(columns, row)) for row in conn.execute('SELECT id, title, artist, album, path, duration FROM media_file ORDER BY rowid')]
+        conn.close()
+        self.songs_by_id = {song['id']: song for song in self.songs}
+        self.word_index = {}  # word -> indexes of the songs whose artist, album or title contain it
+        for index, song in enumerate(self.songs):
+            for word in set(WORD.findall(f"{song['artist']} {song['album']} {song['title']}".lower())):
+                self.word_index.setdefault(word, []).append(index)
+        self.playlists, self.playlist_ids = {}, itertools.count(1)
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def count(self, endpoint):
+        with self.lock: self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def request_counts(self, reset=False):
+        with self.lock:
+            counts = dict(self.counts)
+            if reset: self.counts.clear()
+        return counts
+
+    def search(self, query, count, offset):
+        words = WORD.findall(query.lower())
+        if not words: return self.songs[offset:offset + count]
+        postings = sorted((self.word_index.get(word, []) for word in words), key=len)
+        hits = set(postings[0]).intersection(*postings[1:])
+        return [self.songs[index] for index in sorted(hits)[offset:offset + count]]
+
+def now_iso(): return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args): pass
+
+    def do_GET(self): self.respond(parse_qs(urlparse(self.path).query))
+
+    def do_POST(self):
+        params = parse_qs(urlparse(self.path).query)
+        params.update(parse_qs(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()))
+        self.respond(params)
+
+    def respond(self, params):
+        state = self.server.state
+        endpoint = urlparse(self.path).path.rsplit('/', 1)[-1].removesuffix('.view')
+        state.count(endpoint)
+        if state.latency: time.sleep(state.latency)
+        try: reply = self.handle_endpoint(state, endpoint, params)
+        except (KeyError, ValueError, IndexError): reply = {'status': 'failed', 'error': {'code': 10, 'message': 'Bad request'}}
+        body = json.dumps({'subsonic-response': {'version': '1.16.1', **reply}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json'); self.send_header('Content-Length', str(len(body)))
+        self.end_headers(); self.wfile.write(body)
+
+    @staticmethod
+    def playlist_summary(playlist):
+        songs = playlist['entry']
+        return {'id': playlist['id'], 'name': playlist['name'], 'owner': 'bench', 'songCount': len(songs),
+                'duration': int(sum(song.get('duration') or 0 for song in songs)), 'changed': playlist['changed']}
+
+    def handle_endpoint(self, state, endpoint, params):
+        first = lambda key, default=None: params.get(key, [default])[0]
+        ok = {'status': 'ok'}
+        if endpoint in ('ping', 'getLicense'): return ok
+        if endpoint == 'getScanStatus': return {**ok, 'scanStatus': {'scanning': False, 'count': len(state.songs), 'lastScan': '2020-01-01T00:00:00Z'}}
+        if endpoint == 'getOpenSubsonicExtensions':
+            return {**ok, 'openSubsonicExtensions': [{'name': 'formPost', 'versions': [1]}] if state.form_post else []}
+        if endpoint == 'search3':
+            songs = state.search(first('query', ''), int(first('songCount', '20')), int(first('songOffset', '0')))
+            return {**ok, 'searchResult3': {'song': songs}}
+        with state.lock:
+            if endpoint == 'createPlaylist':
+                playlist_id = str(next(state.playlist_ids))
+                songs = [state.songs_by_id[song_id] for song_id in params.get('songId', []) if song_id in state.songs_by_id]
+                state.playlists[playlist_id] = {'id': playlist_id, 'name': first('name'), 'entry': songs, 'changed': now_iso()}
+                return {**ok, 'playlist': self.playlist_summary(state.playlists[playlist_id])}
+            if endpoint == 'updatePlaylist':
+                playlist = state.playlists[first('playlistId')]
+                for position in sorted({int(position) for position in params.get('songIndexToRemove', [])}, reverse=True):
+                    del playlist['entry'][position]
+                playlist['entry'].extend(state.songs_by_id[song_id] for song_id in params.get('songIdToAdd', []) if song_id in state.songs_by_id)
+                if 'name' in params: playlist['name'] = first('name')
+                playlist['changed'] = now_iso()
+                return ok
+            if endpoint == 'deletePlaylist':
+                del state.playlists[first('id')]; return ok
+            if endpoint == 'getPlaylists':
+                return {**ok, 'playlists': {'playlist': [self.playlist_summary(playlist) for playlist in state.playlists.values()]}}
+            if endpoint == 'getPlaylist':
+                playlist = state.playlists[first('id')]
+                return {**ok, 'playlist': {**self.playlist_summary(playlist), 'entry': list(playlist['entry'])}}
+        return {'status': 'failed', 'error': {'code': 0, 'message': f'Endpoint {endpoint} is not implemented by the stand-in server'}}
+
+class StandInServer:
+    """Runs the stand-in server in a background thread. Use port 0 to pick a free port."""
+
+    def __init__(self, navidrome_db, latency=0.0, host='127.0.0.1', port=0, form_post=True):
+        self.httpd = ThreadingHTTPServer((host, port), StandInHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state = StandInState(navidrome_db, latency, form_post)
+        self.thread = None
+
+    @property
+    def url(self): return f'http://{self.httpd.server_address[0]}:{self.httpd.server_address[1]}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown(); self.httpd.server_close()
+
+    def request_counts(self, reset=False): return self.state.request_counts(reset)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a navidrome.db through a minimal Subsonic API.')
+    parser.add_argument('navidrome_db')
+    parser.add_argument('--port', type=int, default=4533)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    args = parser.parse_args()
+    server = StandInServer(args.navidrome_db, args.latency, port=args.port)
+    print(f'Serving {len(server.state.songs):,} songs on {server.url} (Ctrl+C to stop)')
+    try: server.httpd.serve_forever()
+    except KeyboardInterrupt: server.httpd.server_close()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+# synthlibrary.py - Generates a synthetic iTunes library and a matching navidrome.db for the benchmarks.
+# The XML is written as a stream and the songs are derived from their index, so even 500k tracks
+# need little memory. Every 50th song is left out of navidrome.db to exercise the "not found" paths,
+# and a few M3U playlists (with slightly altered titles here and there) are written for playlisttools.py.
+
+import argparse, hashlib, json, os, sqlite3, random
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+MUSIC_FOLDER = 'file://localhost/C:/Users/bench/Music/iTunes/'
+SONGS_PER_ALBUM = 12
+MISSING_EVERY = 50  # Songs whose index is a multiple of this exist in the XML only.
+M3U_PLAYLISTS = 20
+
+WORDS = ('love night heart dream fire rain blue road time home light dance summer river shadow golden '
+         'electric silver morning city ocean midnight wild broken paper glass stone thunder echo velvet '
+         'neon winter desert northern crystal hollow burning silent sweet lonely distant fading rising').split()
+
+NAVIDROME_SCHEMA = '''
+CREATE TABLE user (id TEXT PRIMARY KEY, user_name TEXT);
+CREATE TABLE media_file (id TEXT PRIMARY KEY, path TEXT, title TEXT, album TEXT, artist TEXT, artist_id TEXT, album_id TEXT,
+                         duration REAL DEFAULT 0, size INTEGER DEFAULT 0, created_at DATETIME, updated_at DATETIME, birth_time DATETIME);
+CREATE INDEX media_file_path ON media_file (path);
+CREATE INDEX media_file_album_id ON media_file (album_id);
+CREATE TABLE album (id TEXT PRIMARY KEY, name TEXT, created_at DATETIME, updated_at DATETIME, imported_at DATETIME);
+CREATE TABLE annotation (user_id TEXT NOT NULL DEFAULT '', item_id TEXT NOT NULL DEFAULT '', item_type TEXT NOT NULL DEFAULT '',
+                         play_count INTEGER DEFAULT 0, play_date DATETIME, rating INTEGER DEFAULT 0, starred BOOL DEFAULT FALSE NOT NULL,
+                         starred_at DATETIME, UNIQUE (user_id, item_id, item_type));
+CREATE TABLE playlist (id VARCHAR(255) NOT NULL PRIMARY KEY, name VARCHAR(255) DEFAULT '' NOT NULL, comment VARCHAR(255) DEFAULT '' NOT NULL,
+                       duration REAL DEFAULT 0 NOT NULL, song_count INTEGER DEFAULT 0 NOT NULL, public BOOL DEFAULT FALSE NOT NULL,
+                       created_at DATETIME, updated_at DATETIME, path STRING DEFAULT '' NOT NULL, sync BOOL DEFAULT FALSE NOT NULL,
+                       size INTEGER DEFAULT 0 NOT NULL, rules VARCHAR, evaluated_at DATETIME, owner_id VARCHAR(255) NOT NULL);
+CREATE TABLE playlist_tracks (id INTEGER DEFAULT 0 NOT NULL, playlist_id VARCHAR(255) NOT NULL, media_file_id VARCHAR(255) NOT NULL,
+                              UNIQUE (playlist_id, id));
+INSERT INTO user VALUES ('bench-user', 'bench');
+'''
+
+def song_fields(index, track_count):
+    """Returns (artist_no, album_no, artist, album, title, relative path) for song `index` (1-based)."""
+    album_no = (index - 1) // SONGS_PER_ALBUM
+    artist_no = album_no % max(10, track_count // 40)
+    artist = f'The {WORDS[artist_no % len(WORDS)].title()} {WORDS[(artist_no * 7 + 3) % len(WORDS)].title()} {artist_no}'
+    album = f'{WORDS[(album_no * 5 + 1) % len(WORDS)].title()} {WORDS[(album_no * 11 + 2) % len(WORDS)].title()} {album_no}'
+    title = f'{WORDS[(index * 13) % len(WORDS)].title()} {WORDS[(index * 29 + 7) % len(WORDS)]} {index}'
+    track_no = (index - 1) % SONGS_PER_ALBUM + 1
+    return artist_no, album_no, artist, album, title, f'{artist}/{album}/{track_no:02d} {title}.mp3'
+
+def playlist_sizes(track_count, seed):
+    rng = random.Random(seed)
+    return [rng.randint(10, 500) for _ in range(max(10, track_count // 1000))]
+
+def write_navidrome_db(path, track_count):
+    if os.path.exists(path): os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(NAVIDROME_SCHEMA)
+    stamp = '2020-01-01 00:00:00.000+00:00'
+    songs = ((index, *song_fields(index, track_count)) for index in range(1, track_count + 1) if index % MISSING_EVERY)
+    with conn:
+        conn.executemany('INSERT INTO media_file VALUES (?, ?, ?, ?, ?, ?, ?, 215.0, 5000000, ?, ?, ?)',
+                         ((f'mf{index}', path, title, album, artist, f'ar{artist_no}', f'al{album_no}', stamp, stamp, stamp)
+                          for index, artist_no, album_no, artist, album, title, path in songs))
+        conn.execute('INSERT INTO album SELECT DISTINCT album_id, album, ?, ?, ? FROM media_file', (stamp, stamp, stamp))
+    conn.close()
+
+def write_itunes_xml(path, track_count, playlists):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" '
+                '"http://www.apple.com/DTDs/PropertyList-1.0.dtd">\n<plist version="1.0">\n<dict>\n'
+                f'\t<key>Major Version</key><integer>1</integer>\n\t<key>Music Folder</key><string>{MUSIC_FOLDER}</string>\n'
+                '\t<key>Tracks</key>\n\t<dict>\n')
+        for index in range(1, track_count + 1):
+            _, _, artist, album, title, relative_path = song_fields(index, track_count)
+            f.write(f'\t\t<key>{index}</key>\n\t\t<dict>\n\t\t\t<key>Track ID</key><integer>{index}</integer>\n'
+                    f'\t\t\t<key>Name</key><string>{escape(title)}</string>\n\t\t\t<key>Artist</key><string>{escape(artist)}</string>\n'
+                    f'\t\t\t<key>Album</key><string>{escape(album)}</string>\n\t\t\t<key>Total Time</key><integer>215000</integer>\n'
+                    f'\t\t\t<key>Date Modified</key><date>2019-0{1 + index % 9}-01T10:00:00Z</date>\n'
+                    f'\t\t\t<key>Date Added</key><date>2015-0{1 + index % 9}-02T10:00:00Z</date>\n')
+            if index % 3: f.write(f'\t\t\t<key>Play Count</key><integer>{index % 40}</integer>\n'
+                                  f'\t\t\t<key>Play Date UTC</key><date>2018-0{1 + index % 9}-03T10:00:00Z</date>\n')
+            if index % 4 == 0: f.write(f'\t\t\t<key>Rating</key><integer>{20 * (index % 6)}</integer>\n')
+            f.write(f'\t\t\t<key>Location</key><string>{MUSIC_FOLDER}Music/{escape(quote(relative_path))}</string>\n\t\t</dict>\n')
+        f.write('\t</dict>\n\t<key>Playlists</key>\n\t<array>\n')
+
+        def write_playlist(name, track_ids, extra=''):
+            persistent_id = hashlib.md5(name.encode()).hexdigest()[:16].upper()
+            f.write(f'\t\t<dict>\n\t\t\t<key>Name</key><string>{escape(name)}</string>\n'
+                    f'\t\t\t<key>Playlist Persistent ID</key><string>{persistent_id}</string>\n{extra}\t\t\t<key>Playlist Items</key>\n\t\t\t<array>\n')
+            for track_id in track_ids: f.write(f'\t\t\t\t<dict><key>Track ID</key><integer>{track_id}</integer></dict>\n')
+            f.write('\t\t\t</array>\n\t\t</dict>\n')
+
+        write_playlist('Library', range(1, track_count + 1), '\t\t\t<key>Master</key><true/>\n')
+        write_playlist('Music', range(1, track_count + 1), '\t\t\t<key>Distinguished Kind</key><integer>4</integer>\n')
+        write_playlist('Recently Played', range(1, min(track_count, 25) + 1), '\t\t\t<key>Smart Info</key><data>AAA=</data>\n')
+        for name, track_ids in playlists: write_playlist(name, track_ids)
+        f.write('\t</array>\n</dict>\n</plist>\n')
+
+def write_m3u_files(folder, track_count, playlists):
+    os.makedirs(folder, exist_ok=True)
+    for name, track_ids in playlists[:M3U_PLAYLISTS]:
+        with open(os.path.join(folder, f'{name}.m3u'), 'w', encoding='utf-8') as f:
+            f.write('#EXTM3U\n')
+            for position, track_id in enumerate(track_ids):
+                relative_path = song_fields(track_id, track_count)[5]
+                if position % 10 == 9: relative_path = relative_path[:-4] + ' (Live).mp3'  # Only a potential match
+                f.write(relative_path + '\n')
+
+def generate(folder, track_count, seed=1, server_url='http://127.0.0.1:4533'):
+    """Writes 'iTunes Library.xml', navidrome.db, an m3u/ folder and config.json into `folder`."""
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    playlists = [(f'Playlist {number:04d}', [rng.randint(1, track_count) for _ in range(size)])
+                 for number, size in enumerate(playlist_sizes(track_count, seed), 1)]
+    xml_path, db_path = os.path.join(folder, 'iTunes Library.xml'), os.path.join(folder, 'navidrome.db')
+    write_itunes_xml(xml_path, track_count, playlists)
+    write_navidrome_db(db_path, track_count)
+    write_m3u_files(os.path.join(folder, 'm3u'), track_count, playlists)
+    config = {'navidrome_db': os.path.abspath(db_path), 'itunes_xml': os.path.abspath(xml_path),
+              'server_url': server_url, 'username': 'bench', 'password': 'bench',
+              'navidrome_url': server_url, 'navidrome_user': 'bench', 'navidrome_password': 'bench'}
+    with open(os.path.join(folder, 'config.json'), 'w') as f: json.dump(config, f, indent=4)
+    return {'tracks': track_count, 'playlists': len(playlists), 'playlist_entries': sum(len(ids) for _, ids in playlists)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic iTunes library and navidrome.db.')
+    parser.add_argument('tracks', type=int)
+    parser.add_argument('folder')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    print(generate(args.folder, args.tracks, args.seed))
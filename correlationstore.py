@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+# correlationstore.py - The iTunes track ID -> Navidrome song ID map shared by the scripts.
+# itunestoND.py writes it, itunesPlaylistMigrator.py reads it (and keeps its playlist map next to it). The map lives in a small SQLite
+# file, so opening it is instant regardless of its size, lookups can be batched, and a re-run
+# only has to rewrite the entries that actually changed.
+
+import sqlite3
+
+CORRELATION_FILE = 'IT_file_correlations.db'
+BATCH_SIZE = 500  # Stays well below SQLite's limit on the number of query parameters.
+
+class CorrelationStore:
+    """Persistent iTunes ID -> Navidrome ID map backed by SQLite."""
+
+    def __init__(self, path=CORRELATION_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS correlation (itunes_id INTEGER PRIMARY KEY, navidrome_id TEXT NOT NULL)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS playlist_map (persistent_id TEXT PRIMARY KEY, navidrome_id TEXT NOT NULL, '
+                          'digest TEXT, changed TEXT)')
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+    def close(self):
+        if self.conn: self.conn.close(); self.conn = None
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM correlation').fetchone()[0]
+
+    def __contains__(self, itunes_id):
+        return self.get(itunes_id) is not None
+
+    def get(self, itunes_id, default=None):
+        row = self.conn.execute('SELECT navidrome_id FROM correlation WHERE itunes_id = ?', (itunes_id,)).fetchone()
+        return row[0] if row else default
+
+    def get_many(self, itunes_ids):
+        """Returns {itunes_id: navidrome_id} for all of the given IDs that are known."""
+        itunes_ids, found = list(itunes_ids), {}
+        for start in range(0, len(itunes_ids), BATCH_SIZE):
+            batch = itunes_ids[start:start + BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            found.update(self.conn.execute(f'SELECT itunes_id, navidrome_id FROM correlation WHERE itunes_id IN ({placeholders})', batch))
+        return found
+
+    def lookup_many(self, itunes_ids):
+        """Maps a sequence of iTunes IDs to Navidrome IDs, keeping the order. Unknown IDs become None."""
+        found = self.get_many(set(itunes_ids))
+        return [found.get(itunes_id) for itunes_id in itunes_ids]
+
+    def items(self):
+        return self.conn.execute('SELECT itunes_id, navidrome_id FROM correlation ORDER BY itunes_id')
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def update(self, mapping):
+        """Inserts or replaces the given {itunes_id: navidrome_id} entries."""
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO correlation (itunes_id, navidrome_id) VALUES (?, ?)', mapping.items())
+
+    def sync(self, mapping):
+        """Makes the store equal to `mapping`, writing only the differences. Returns (changed, removed) counts."""
+        existing = self.to_dict()
+        changed = {itunes_id: nd_id for itunes_id, nd_id in mapping.items() if existing.get(itunes_id) != nd_id}
+        removed = [(itunes_id,) for itunes_id in existing if itunes_id not in mapping]
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO correlation (itunes_id, navidrome_id) VALUES (?, ?)', changed.items())
+            self.conn.executemany('DELETE FROM correlation WHERE itunes_id = ?', removed)
+        return len(changed), len(removed)
+
+    def playlist_map(self):
+        """Returns {iTunes playlist persistent ID: (Navidrome playlist ID, digest of the synced tracks, server 'changed' stamp)}."""
+        return {row[0]: tuple(row[1:]) for row in self.conn.execute('SELECT persistent_id, navidrome_id, digest, changed FROM playlist_map')}
+
+    def update_playlist_map(self, entries):
+        """Inserts or replaces {persistent_id: (navidrome_id, digest, changed)} entries."""
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO playlist_map VALUES (?, ?, ?, ?)', ((key, *value) for key, value in entries.items()))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+# fuzzymatch.py - Trigram based fuzzy matching of (artist, title) pairs against a local song catalogue.
+# Used by playlisttools.py for the "maybe" pass. Titles are reduced to their identifying words
+# ('Song (Remastered 2011)' -> 'song'), split into character trigrams and looked up through an
+# inverted index, so reordered words, version suffixes and featured artists still score high. Titles that
+# differ too much on their own, or by a number ('Symphony No. 5' vs 'No. 9'), never match, however well the artist does.
+# Everything runs in memory; thousands of misses are scored in one batch without touching the network.
+
+import math, re
+from collections import Counter
+
+BRACKETS = re.compile(r'\s*[\(\[\{][^\)\]\}]*[\)\]\}]')
+VERSION_SUFFIX = re.compile(r'\s+-\s+.*\b(remaster\w*|live|version|edit|mix|mono|stereo|demo|acoustic)\b.*$')
+FEATURING = re.compile(r'\s+(feat\.?|ft\.?|featuring)\s+.*$')
+NON_WORD = re.compile(r'[\W_]+')
+NUMBER = re.compile(r'\d+')
+
+DEFAULT_THRESHOLD = 0.6
+TITLE_WEIGHT = 0.75  # The rest of the score comes from the artist.
+MIN_TITLE_SIMILARITY = 0.65  # However well the artist matches, a title below this is a different song.
+MAX_CANDIDATES = 200  # Titles sharing the most trigrams with the query that are scored exactly.
+
+def clean_text(text):
+    """Lowercases and removes the parts that don't identify a song: bracketed notes, version suffixes
+       like ' - 2011 Remaster' and featured artists."""
+    text = (text or '').lower()
+    text = BRACKETS.sub('', text)
+    text = VERSION_SUFFIX.sub('', text)
+    text = FEATURING.sub('', text)
+    return NON_WORD.sub(' ', text).strip()
+
+def trigrams(text):
+    """Character trigrams per word (padded), so the order of the words barely matters."""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+def contains_words(text_a, text_b):
+    """True if one cleaned text appears as whole words in the other ('artist' in 'artist other band')."""
+    if not text_a or not text_b: return False
+    return f' {text_a} ' in f' {text_b} ' or f' {text_b} ' in f' {text_a} '
+
+def similarity(grams_a, grams_b):
+    """Dice coefficient of two trigram sets, between 0.0 and 1.0."""
+    if not grams_a or not grams_b: return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+class FuzzyMatcher:
+    """Inverted trigram index over the titles of a list of Subsonic song dicts."""
+
+    def __init__(self, songs, threshold=DEFAULT_THRESHOLD):
+        self.songs, self.threshold = songs, threshold
+        self.title_grams, self.title_numbers, self.artist_grams, self.artist_names = [], [], [], []
+        self.postings = {}  # trigram -> indexes of the songs whose title contains it
+        self.by_artist = {}  # cleaned artist -> song indexes
+        for index, song in enumerate(songs):
+            title, artist = clean_text(song.get('title')), clean_text(song.get('artist'))
+            title_grams = trigrams(title)
+            self.title_grams.append(title_grams)
+            self.title_numbers.append(frozenset(NUMBER.findall(title)))
+            self.artist_grams.append(trigrams(artist))
+            self.artist_names.append(artist)
+            self.by_artist.setdefault(artist, []).append(index)
+            for gram in title_grams: self.postings.setdefault(gram, []).append(index)
+        self._artist_cache = {}
+
+    def _songs_by_artist(self, artist):
+        """Indexes of the songs whose artist contains the given artist as whole words, or the other way round."""
+        if artist not in self._artist_cache:
+            found = []
+            if artist:
+                for name, indexes in self.by_artist.items():
+                    if contains_words(artist, name): found.extend(indexes)
+            self._artist_cache[artist] = found
+        return self._artist_cache[artist]
+
+    def _score(self, index, title_grams, title_numbers, artist, artist_grams):
+        if title_numbers and self.title_numbers[index] and title_numbers != self.title_numbers[index]: return 0.0
+        if contains_words(artist, self.artist_names[index]): artist_score = 1.0
+        else: artist_score = similarity(artist_grams, self.artist_grams[index])
+        title_score = similarity(title_grams, self.title_grams[index])
+        if title_score < MIN_TITLE_SIMILARITY: return 0.0
+        return TITLE_WEIGHT * title_score + (1 - TITLE_WEIGHT) * artist_score
+
+    def rank(self, artist, title, limit=5, threshold=None):
+        """Returns up to `limit` (score, song) candidates with a score of at least `threshold`, best first."""
+        threshold = self.threshold if threshold is None else threshold
+        title, artist = clean_text(title), clean_text(artist)
+        title_grams, title_numbers, artist_grams = trigrams(title), frozenset(NUMBER.findall(title)), trigrams(artist)
+        # A title can only reach the threshold if it shares at least `min_shared` trigrams with the query, so it
+        # has to appear in one of the rarest len - min_shared + 1 posting lists (prefix filtering).
+        min_title_score = max(MIN_TITLE_SIMILARITY, (threshold - (1 - TITLE_WEIGHT)) / TITLE_WEIGHT)
+        min_shared = max(1, math.ceil(min_title_score * len(title_grams) / 2))
+        rare_grams = sorted((gram for gram in title_grams if gram in self.postings), key=lambda gram: len(self.postings[gram]))
+        shared = Counter()
+        for gram in rare_grams[:max(0, len(title_grams) - min_shared + 1)]: shared.update(self.postings[gram])
+        candidates = set(self._songs_by_artist(artist))
+        candidates.update(index for index, _ in shared.most_common(MAX_CANDIDATES))
+        scored = [(self._score(index, title_grams, title_numbers, artist, artist_grams), index) for index in candidates]
+        scored = sorted((item for item in scored if item[0] and item[0] >= threshold), key=lambda item: (-item[0], item[1]))
+        return [(score, self.songs[index]) for score, index in scored[:limit]]
+
+    def best_matches(self, tracks, threshold=None):
+        """Scores a batch of tracks ({'artist': ..., 'title': ...}) in one pass. Identical queries are only
+           scored once. Returns a (score, song) tuple or None per track, in the same order."""
+        results, seen = [], {}
+        for track in tracks:
+            key = (clean_text(track['artist']), clean_text(track['title']))
+            if key not in seen:
+                ranked = self.rank(track['artist'], track['title'], limit=1, threshold=threshold)
+                seen[key] = ranked[0] if ranked else None
+            results.append(seen[key])
+        return results
+
+if __name__ == '__main__':  # Regression check: python fuzzymatch.py
+    import sys
+    songs = [{'artist': 'The Band', 'title': 'Love Song'}, {'artist': 'The Band', 'title': 'Yesterday (Remastered 2009)'},
+             {'artist': 'Other Artist', 'title': 'Stairway to Heaven'}, {'artist': 'Other Artist', 'title': 'Symphony No. 5'}]
+    cases = [  # (artist, title, expected title or None for missing)
+        ('The Band', 'Love Me', None),  # Same artist, clearly different title
+        ('The Band', 'Lonely Song', None),
+        ('Other Artist', 'Symphony No. 9', None),  # Only the number differs
+        ('Other Artist', 'Symphny No 5', 'Symphony No. 5'),
+        ('The Band feat. Guest', 'Love Song - 2011 Remaster', 'Love Song'),
+        ('The Band', 'Yesterdy', 'Yesterday (Remastered 2009)'),
+        ('Other Artist', 'Heaven to Stairway', 'Stairway to Heaven'),
+    ]
+    matcher, failures = FuzzyMatcher(songs), 0
+    for artist, title, expected in cases:
+        ranked = matcher.rank(artist, title, limit=1)
+        found = ranked[0][1]['title'] if ranked else None
+        if found != expected: failures += 1
+        print(f"[{'OK' if found == expected else 'FAIL'}] {artist} - {title}: {found or 'missing'}" + (f' ({ranked[0][0]:.0%})' if ranked else ''))
+    sys.exit(1 if failures else 0)
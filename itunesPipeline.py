@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+# itunesPipeline.py - Runs itunestoND.py and itunesPlaylistMigrator.py as one unattended migration.
+# The iTunes XML is parsed once: its tracks feed the ratings/play count/timestamp stage, and the playlists
+# that follow them in the same stream are collected for the playlist stage. The iTunes -> Navidrome ID map
+# is handed over in memory (and still saved to IT_file_correlations.db). Nothing is asked interactively,
+# so the whole migration can run from cron:
+#
+#   python itunesPipeline.py --incremental
+
+import sys, json, os, argparse
+from pathlib import Path
+from itunesreader import ITunesLibrary, library_cache_path
+from correlationstore import CorrelationStore, CORRELATION_FILE
+from metrics import Metrics, add_metrics_arguments
+import itunestoND
+import itunesPlaylistMigrator
+
+REQUIRED_KEYS = ('navidrome_db', 'itunes_xml')
+SERVER_KEYS = ('server_url', 'username', 'password')
+
+def load_config(path, with_server):
+    """Reads config.json without asking for anything. Exits if a required setting is missing."""
+    if not os.path.isfile(path): print(f"ERROR: Configuration file '{path}' not found. Run itunestoND.py once to create it."); sys.exit(2)
+    with open(path, 'r') as f: config = json.load(f)
+    missing = [key for key in REQUIRED_KEYS + (SERVER_KEYS if with_server else ()) if not config.get(key)]
+    if missing: print(f"ERROR: {path} is missing {', '.join(missing)}."); sys.exit(2)
+    return config
+
+def split_stream(library, wanted):
+    """Returns (tracks, playlists): a generator over the library's tracks, and a list that the same pass
+       fills with the user playlists accepted by `wanted` as the parser reaches them."""
+    playlists = []
+    def tracks():
+        for kind, record in library.items():
+            if kind == 'track': yield record
+            elif itunesPlaylistMigrator.is_user_playlist(record) and wanted(record): playlists.append(record)
+    return tracks(), playlists
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrates ratings, play counts, timestamps and playlists from iTunes to Navidrome in one run, without prompts.')
+    parser.add_argument('--config', default=itunestoND.CONFIG_FILE, help='path to config.json (default: %(default)s)')
+    parser.add_argument('--incremental', action='store_true', help='only sync songs that changed since the last checkpoint and keep plays recorded by Navidrome')
+    parser.add_argument('--skip-playlists', action='store_true', help='only migrate ratings, play counts and timestamps')
+    parser.add_argument('--playlist', action='append', metavar='NAME', help='only migrate this playlist (can be repeated)')
+    parser.add_argument('--playlists-to-database', action='store_true', help='write the playlists straight into navidrome.db instead of using the API (no server needed)')
+    parser.add_argument('--sync', action='store_true', help='update the playlists created by an earlier run (or with the same name) instead of creating new ones')
+    parser.add_argument('--workers', type=int, help="playlists migrated in parallel (default: 'playlist_workers' from config.json, or 4)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.sync and args.playlists_to_database: parser.error('--sync works through the API and cannot be combined with --playlists-to-database')
+    metrics = itunesPlaylistMigrator.metrics = Metrics.from_args('itunesPipeline.py', args)
+
+    with_playlists = not args.skip_playlists
+    via_api = with_playlists and not args.playlists_to_database
+    config = load_config(args.config, via_api)
+    # The checkpoint and ID map live next to config.json, like the library cache, whatever directory cron starts in.
+    data_dir = os.path.dirname(os.path.abspath(args.config))
+    checkpoint_path, correlation_path = os.path.join(data_dir, itunestoND.CHECKPOINT_FILE), os.path.join(data_dir, CORRELATION_FILE)
+    if via_api:
+        # Playlists are created through the running server, so its database must be written in place: a swapped-in
+        # copy is either refused (the server's WAL isn't empty) or replaces the file under the server's feet.
+        if config.get('bulk_write') is True: print("Note: 'bulk_write' is ignored while playlists are migrated through the API.")
+        config['bulk_write'] = False
+    library = ITunesLibrary(Path(config['itunes_xml']), library_cache_path(args.config, config))
+
+    with metrics.phase('pre-flight'):
+        music_folder_url, media_index = itunestoND.pre_flight_check(config, library)
+        # Connect before the long track stage, so a server problem is reported right away.
+        if via_api: itunesPlaylistMigrator.connect(config)
+
+    previous_states = None
+    if args.incremental:
+        with metrics.phase('checkpoint-load') as phase:
+            previous_states = itunestoND.load_checkpoint(checkpoint_path)
+            phase.items = len(previous_states or ())
+        if not previous_states: print(f"No checkpoint found in {checkpoint_path}, running a full sync instead.")
+
+    wanted_names = set(args.playlist or ())
+    tracks, playlists = split_stream(library, lambda plist: with_playlists and (not wanted_names or plist.name in wanted_names))
+    id_map, committed, complete = itunestoND.sync_tracks(config, tracks, music_folder_url, media_index, previous_states, metrics, checkpoint_path)
+    itunestoND.save_correlations(id_map, metrics, complete, correlation_path)
+
+    exit_code = 0 if committed else 1
+    if with_playlists and not complete:
+        print("\nThe track stage stopped before the whole library was read; playlists were not migrated.")
+    elif with_playlists:
+        if not committed: print("\nThe track stage failed; playlists are migrated with the songs that were matched.")
+        print(f"\nFound {len(playlists)} user-created playlists in your library.")
+        if wanted_names - {plist.name for plist in playlists}:
+            print(f"Warning: playlist(s) not found: {', '.join(sorted(wanted_names - {plist.name for plist in playlists}))}")
+        lookup_many = lambda track_ids: [id_map.get(track_id) for track_id in track_ids]
+        if via_api:
+            workers = max(1, args.workers or int(config.get('playlist_workers', itunesPlaylistMigrator.DEFAULT_WORKERS)))
+            if args.sync:
+                with CorrelationStore(correlation_path) as store: summary = itunesPlaylistMigrator.sync_playlists(playlists, lookup_many, workers, store)
+            else: summary = itunesPlaylistMigrator.migrate_playlists(playlists, lookup_many, workers)
+            print("\n--- API CALLS ---")
+            print('\n'.join(itunesPlaylistMigrator.client.latency_report()))
+            metrics.record_api(itunesPlaylistMigrator.client)
+        else: summary = itunesPlaylistMigrator.import_playlists(config['navidrome_db'], playlists, lookup_many)
+        if summary['failed']: exit_code = 1
+
+    metrics.finish()
+    print('\nMigration finished.' if not exit_code else '\nMigration finished with errors.')
+    sys.exit(exit_code)
+
+if __name__ == '__main__':
+    main()
@@ -3,16 +3,32 @@
 # itunesPlaylistMigrator.py - Used in conjunction with itunestoND.py
 # First run that script, then run this one while you have your Navidrome server running.
 # It will parse the Itunes library XML file and use the Navidrome API to transfer your playlists.
+# With --database the playlists are written straight into navidrome.db instead (no server needed).
+# With --sync existing server playlists are updated in place instead of being created again.
 # DEFINITIVE VERSION: Has pre-flight checks, config file, bulk import, and cleans up empty playlists.
 
 from pathlib import Path
-import sys, requests, urllib.parse, random, re, string, json, os
-from bs4 import BeautifulSoup
+import sys, urllib.parse, re, json, os, sqlite3, argparse, time, uuid, hashlib
+from itunesreader import ITunesLibrary, library_cache_path
+from correlationstore import CorrelationStore, CORRELATION_FILE
+from subsonicclient import SubsonicClient
+from metrics import Metrics, add_metrics_arguments
+import itunestoND
 import pyinputplus as pyip
-from hashlib import md5
+from concurrent.futures import ThreadPoolExecutor
 
 CONFIG_FILE = 'config.json'
-CORRELATION_FILE = 'IT_file_correlations.py'
+DEFAULT_WORKERS = 4  # Playlists migrated in parallel, unless 'playlist_workers' is set in config.json.
+# Size limits for the encoded songIdToAdd parameters of one updatePlaylist request. GET requests have to stay
+# well below the 8 KB request line most reverse proxies accept; form POST bodies can be much larger.
+MAX_GET_PARAM_BYTES = 6000
+MAX_POST_PARAM_BYTES = 250000
+CHUNK_RETRIES = 3
+PLAYLISTS_TO_SKIP = ('Library', 'Downloaded', 'Music', 'Movies', 'TV Shows', 'Podcasts', 'Audiobooks', 'Tagged', 'Genius')
+
+# Set by connect() and main(); the migration functions below share them.
+client, use_form_post = None, False
+metrics = Metrics('itunesPlaylistMigrator.py')
 
 def pre_flight_check():
     """Checks for the existence of necessary configuration and correlation files."""
@@ -32,20 +48,21 @@ def pre_flight_check():
     else:
         print(f"[FAIL] Correlation file '{CORRELATION_FILE}' not found. Please run 'itunestoND.py' first.")
     
+    itunes_correlations = None
     if checks['correlation_file_found']:
         try:
-            from IT_file_correlations import itunes_correlations
-            if itunes_correlations:
+            itunes_correlations = CorrelationStore(CORRELATION_FILE)
+            correlation_count = len(itunes_correlations)
+            if correlation_count:
                 checks['correlation_data_found'] = True
-                print(f"[OK]   Successfully imported {len(itunes_correlations)} song correlations.")
+                print(f"[OK]   Successfully opened {correlation_count} song correlations.")
             else:
                 print(f"[FAIL] Correlation file '{CORRELATION_FILE}' is empty. The main script could not match any songs.")
-        except (ImportError, SyntaxError):
-            print(f"[FAIL] Could not import data from '{CORRELATION_FILE}'. It may be corrupt.")
+        except sqlite3.Error:
+            print(f"[FAIL] Could not read data from '{CORRELATION_FILE}'. It may be corrupt.")
     
     if all(checks.values()):
         print("\n--- Pre-flight Check Passed ---\n")
-        from IT_file_correlations import itunes_correlations
         return itunes_correlations
     else:
         print("\n--- PRE-FLIGHT CHECK FAILED ---")
@@ -68,122 +85,381 @@ def get_full_configuration():
         print("\nServer details saved to config.json for future use.")
         return config
 
-def send_api_request(endpoint, **kwargs):
-    api_args = {'f': 'json', 'u': username, 'v': '1.16.1', 'c': 'python'}
-    api_args.update(kwargs)
-    pool = string.ascii_letters + string.digits
-    salt = ''.join(random.choice(pool) for i in range(7))
-    token = md5((password + salt).encode('utf-8')).hexdigest()
-    api_args.update({'t': token, 's': salt})
+def connect(config):
+    """Creates the API client from config.json and checks the connection. Exits if the server can't be reached."""
+    global client, use_form_post
+    client = SubsonicClient.from_config(config, 'server_url', 'username', 'password', log=print)
+    print("\nAttempting to connect to the server...")
+    if not client.request('ping'):
+        print("Connection to server failed. Please check the server address in config.json and ensure Navidrome is running. Exiting.")
+        sys.exit(1)
+    print('Connection to server successful.')
+    use_form_post = server_supports_form_post()
+    if use_form_post: print('The server accepts form POST requests; large playlists will be sent in bigger batches.')
+    return client
 
-    try:
-        res = requests.get(server_url + endpoint, params=api_args)
-        res.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"\nCould not reach Navidrome Server at {server_url.partition('rest/')[0]}")
-        print(f"Error: {e}"); return None
+def is_user_playlist(plist):
+    """False for the library itself, iTunes' built-in playlists and smart playlists."""
+    return not (plist.is_distinguished or plist.is_smart or plist.name in PLAYLISTS_TO_SKIP)
 
-    try:
-        res_json = res.json()
-        if 'subsonic-response' in res_json:
-            subsonic_res = res_json['subsonic-response']
-            if subsonic_res.get('status') == 'ok': return subsonic_res
-            elif 'error' in subsonic_res: print(f"\nAPI Error: {subsonic_res['error']['message']} (Code: {subsonic_res['error']['code']})")
-            else: print("\nAPI Error: Unexpected response from server.")
-        else: print("\nAPI Error: The server's response was not in the expected format.")
-        return None
-    except json.JSONDecodeError:
-        print("\nAPI Error: Could not decode the server's response."); return None
-
-def migrate_playlist(plist, itunes_correlations):
-    """Handles the migration of a single playlist."""
-    playlist_name = plist.find('key', text='Name').find_next('string').text
-    try: playlist_tracks = plist.array.find_all('dict')
-    except AttributeError: return
-    if not playlist_tracks: return
-
-    print(f'\nMigrating playlist "{playlist_name}" ({len(playlist_tracks)} tracks)...')
+def server_supports_form_post():
+    """Asks the server whether it accepts parameters in POST form bodies (the OpenSubsonic 'formPost' extension)."""
+    res = client.request('getOpenSubsonicExtensions', log=lambda *args: None)
+    if not res: return False
+    return any(extension.get('name') == 'formPost' for extension in res.get('openSubsonicExtensions', []))
+
+def chunk_track_ids(track_ids, max_bytes, param='songIdToAdd'):
+    """Splits track IDs (or indexes) into consecutive batches whose encoded `param` parameters fit into max_bytes."""
+    batch, size = [], 0
+    for track_id in track_ids:
+        cost = len(f'&{param}=') + len(urllib.parse.quote(str(track_id), safe=''))
+        if batch and size + cost > max_bytes:
+            yield batch
+            batch, size = [], 0
+        batch.append(track_id); size += cost
+    if batch: yield batch
+
+def playlist_song_count(ND_playlist_id, log):
+    """The number of tracks the server has in the playlist right now, or None if it can't be read."""
+    reply = client.request('getPlaylist', log=log, id=ND_playlist_id)
+    if not reply: return None
+    return reply['playlist'].get('songCount', len(reply['playlist'].get('entry', [])))
+
+def send_batch(ND_playlist_id, chunk, number, expected, log):
+    """Appends one batch of add_tracks to a playlist that holds `expected` tracks. Before a failed batch is sent
+       again, the playlist's song count shows whether it arrived after all, so it is never appended twice.
+       Returns True once the batch is in the playlist."""
+    for attempt in range(1, CHUNK_RETRIES + 1):
+        if attempt > 1:
+            song_count = playlist_song_count(ND_playlist_id, log)  # getPlaylist is read-only, so the client already retried it
+            if song_count is None:
+                log(f'  - Batch {number} failed and the playlist could not be read to check whether it arrived, so it is not sent again.'); return False
+            if song_count == expected + len(chunk): return True  # The failed attempt went through; only its reply was lost.
+            if song_count != expected:
+                log(f'  - The playlist holds {song_count} tracks instead of {expected}, so batch {number} is not sent again.'); return False
+            log(f'  - Batch {number} failed, retrying ({attempt - 1}/{CHUNK_RETRIES - 1})...')
+        if client.request('updatePlaylist', log=log, post=use_form_post, retry=False, playlistId=ND_playlist_id, songIdToAdd=chunk): return True
+    return False
+
+def add_tracks(ND_playlist_id, ND_track_ids, log, start_count=0):
+    """Appends the tracks to a playlist that holds start_count tracks, in size-limited batches, in order. At the
+       first batch that can't be added the remaining ones are not sent either, so the playlist always holds the
+       start of the list in the right order. Returns the number of tracks that were not added."""
+    max_bytes = MAX_POST_PARAM_BYTES if use_form_post else MAX_GET_PARAM_BYTES
+    chunks = list(chunk_track_ids(ND_track_ids, max_bytes))
+    if len(chunks) > 1: log(f'  - Sending the tracks in {len(chunks)} batches...')
+    added = 0
+    for number, chunk in enumerate(chunks, 1):
+        if not send_batch(ND_playlist_id, chunk, number, start_count + added, log):
+            log(f'  - ERROR: Batch {number} ({len(chunk)} tracks) could not be added; the {len(ND_track_ids) - added - len(chunk)} tracks after it were not sent.')
+            return len(ND_track_ids) - added
+        added += len(chunk)
+    return 0
+
+def remove_tracks(ND_playlist_id, indexes, log):
+    """Removes the tracks at the given positions. Batches are sent from the highest positions down, so the positions
+       of a later batch are not shifted by an earlier one. A batch is never sent twice (a removal that went through
+       but whose reply got lost would then remove the wrong tracks); returns False if a batch failed, after which
+       the playlist has to be read again before anything else is removed."""
+    max_bytes = MAX_POST_PARAM_BYTES if use_form_post else MAX_GET_PARAM_BYTES
+    for chunk in chunk_track_ids(sorted(indexes, reverse=True), max_bytes, 'songIndexToRemove'):
+        if not client.request('updatePlaylist', log=log, post=use_form_post, retry=False, playlistId=ND_playlist_id, songIndexToRemove=chunk):
+            log(f'  - ERROR: {len(chunk)} tracks could not be removed.'); return False
+    return True
+
+def migrate_playlist(playlist_name, it_track_count, ND_track_ids):
+    """Handles the migration of a single playlist. Runs in a worker thread: the create/update/delete calls
+       for one playlist always happen in order, and its output is collected and returned as (status, lines)."""
+    lines = [f'\nMigrating playlist "{playlist_name}" ({it_track_count} tracks)...']
+    log = lines.append
     
-    create_playlist_reply = send_api_request('createPlaylist', name=playlist_name)
+    create_playlist_reply = client.request('createPlaylist', log=log, retry=False, name=playlist_name)
     if not create_playlist_reply:
-        print(f'  - ERROR: Failed to create playlist in Navidrome.'); return
+        log(f'  - ERROR: Failed to create playlist in Navidrome.'); return 'failed', lines
 
     ND_playlist_id = create_playlist_reply['playlist']['id']
-    it_track_ids = [int(track.integer.text) for track in playlist_tracks]
     
-    ND_track_ids = []
-    missing_songs_count = 0
-    for it_id in it_track_ids:
-        if it_id in itunes_correlations: ND_track_ids.append(itunes_correlations[it_id])
-        else: missing_songs_count += 1
-            
+    missing_songs_count = it_track_count - len(ND_track_ids)
     if missing_songs_count > 0:
-        print(f"  - Warning: {missing_songs_count} song(s) will be skipped (not found in Navidrome library).")
+        log(f"  - Warning: {missing_songs_count} song(s) will be skipped (not found in Navidrome library).")
 
     if not ND_track_ids:
-        # --- NEW: Self-cleaning logic ---
-        print("  - No valid songs found for this playlist. Deleting empty playlist from Navidrome and skipping.")
-        send_api_request('deletePlaylist', id=ND_playlist_id)
-        return
-
-    print(f'  - Adding {len(ND_track_ids)} tracks...')
-    add_tracks_reply = send_api_request('updatePlaylist', playlistId=ND_playlist_id, songIdToAdd=ND_track_ids)
-
-    if add_tracks_reply: print(f'  - SUCCESS: Playlist "{playlist_name}" migrated.')
-    else: print(f'  - ERROR: Failed to add tracks to playlist.')
-
-# --- Main script starts here ---
-
-itunes_correlations = pre_flight_check()
-config = get_full_configuration()
-
-server_url, username, password = config['server_url'], config['username'], config['password']
-if not server_url.startswith('http'): server_url = 'http://' + server_url
-if not server_url.endswith('/'): server_url += '/'
-if not server_url.endswith('/rest/'): server_url += 'rest/'
-
-print("\nAttempting to connect to the server...")
-if not send_api_request('ping'):
-    print("Connection to server failed. Please check the server address in config.json and ensure Navidrome is running. Exiting.")
-    sys.exit(1)
-print('Connection to server successful.')
-
-it_db_path = Path(config['itunes_xml'])
-if not it_db_path.is_file():
-    print(f"ERROR: Could not find iTunes XML at path in config.json: {it_db_path}"); sys.exit(1)
-
-print(f'\nUsing "{it_db_path}" for the iTunes library.')
-print("Parsing the XML file... this may take a moment for large libraries.")
-with open(it_db_path, 'r', encoding="utf-8") as f:
-    soup = BeautifulSoup(f, 'lxml-xml')
-all_playlists_in_xml = soup.array.find_all('dict', recursive=False)
-print("Parsing complete.")
-
-playlists_to_skip = ('Library', 'Downloaded', 'Music', 'Movies', 'TV Shows', 'Podcasts', 'Audiobooks', 'Tagged', 'Genius')
-valid_playlists = []
-for plist in all_playlists_in_xml:
-    if plist.find('key', text='Distinguished Kind'): continue
-    if plist.find('key', text='Smart Info'): continue
-    playlist_name = plist.find('key', text='Name').find_next('string').text
-    if playlist_name in playlists_to_skip: continue
-    valid_playlists.append(plist)
-
-print(f"\nFound {len(valid_playlists)} user-created playlists in your library.")
-if not valid_playlists:
-    print("No playlists to migrate. Exiting."); sys.exit(0)
-
-migrate_all = pyip.inputYesNo(prompt='Do you want to migrate ALL of them automatically? (y/n) ')
-
-if migrate_all == 'yes':
-    for plist in valid_playlists:
-        migrate_playlist(plist, itunes_correlations)
-else:
-    print("\nOkay, I will ask you about each playlist individually.")
-    for plist in valid_playlists:
-        playlist_name = plist.find('key', text='Name').find_next('string').text
-        track_count = len(plist.array.find_all('dict'))
-        should_migrate = pyip.inputYesNo(prompt=f'\nDo you want to migrate "{playlist_name}" ({track_count} tracks)? (y/n) ')
-        if should_migrate == 'yes':
-            migrate_playlist(plist, itunes_correlations)
-
-print("\nPlaylist migration finished.")
\ No newline at end of file
+        # --- Self-cleaning logic ---
+        log("  - No valid songs found for this playlist. Deleting empty playlist from Navidrome and skipping.")
+        client.request('deletePlaylist', log=log, retry=False, id=ND_playlist_id)
+        return 'empty', lines
+
+    log(f'  - Adding {len(ND_track_ids)} tracks...')
+    failed_tracks = add_tracks(ND_playlist_id, ND_track_ids, log)
+
+    if not failed_tracks:
+        log(f'  - SUCCESS: Playlist "{playlist_name}" migrated.')
+        return ('partial' if missing_songs_count else 'migrated'), lines
+    log(f'  - ERROR: Only the first {len(ND_track_ids) - failed_tracks} of {len(ND_track_ids)} tracks were added to the playlist.'); return 'failed', lines
+
+def lookup_jobs(playlists, lookup_many):
+    """Returns (name, iTunes track count, Navidrome track IDs, persistent ID) for every non-empty playlist.
+       lookup_many maps a list of iTunes track IDs to Navidrome IDs (None where unknown)."""
+    jobs = []
+    with metrics.phase('correlation-lookup') as phase:
+        for plist in playlists:
+            if not plist.track_ids: continue
+            ND_track_ids = [nd_id for nd_id in lookup_many(plist.track_ids) if nd_id is not None]
+            jobs.append((plist.name, len(plist.track_ids), ND_track_ids, plist.persistent_id))
+            phase.items += len(plist.track_ids)
+    return jobs
+
+def print_summary(summary):
+    print("\n--- MIGRATION SUMMARY ---")
+    print(f"  Migrated completely:         {summary['migrated']}")
+    print(f"  Migrated with songs missing: {summary['partial']}")
+    print(f"  Skipped (no matching songs): {summary['empty']}")
+    print(f"  Failed:                      {summary['failed']}")
+
+def migrate_playlists(playlists, lookup_many, workers):
+    """Migrates the playlists with a pool of worker threads. Results are printed in the original playlist order
+       as soon as they are available, followed by a summary. Returns the counts of the summary."""
+    # The correlation lookups stay in this thread; only the API calls run in the pool.
+    jobs = lookup_jobs(playlists, lookup_many)
+    print(f"\nMigrating {len(jobs)} playlists using {workers} parallel connections...")
+    summary = {'migrated': 0, 'partial': 0, 'empty': 0, 'failed': 0}
+    with metrics.phase('migrate', len(jobs)), ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(migrate_playlist, *job[:3]) for job in jobs]
+        for done, future in enumerate(futures, 1):
+            status, lines = future.result()
+            summary[status] += 1
+            print('\n'.join(lines))
+            print(f'  [{done}/{len(jobs)} playlists processed]')
+
+    print_summary(summary)
+    return summary
+
+def playlist_digest(name, ND_track_ids):
+    """Fingerprint of what a synced playlist should contain, so changes on the iTunes side are noticed without asking the server."""
+    return hashlib.blake2b('\n'.join([name, *ND_track_ids]).encode('utf-8'), digest_size=16).hexdigest()
+
+def playlist_diff(current, desired):
+    """Order-aware diff restricted to what updatePlaylist can do: remove by position and append at the end.
+       Keeps the longest start of `desired` that appears in `current` in the same order and returns
+       (positions in `current` to remove, IDs to append).
+       E.g. current [a, b, c, d], desired [a, c, d, e] -> remove [1], append [e]."""
+    remove, kept = [], 0
+    for index, song_id in enumerate(current):
+        if kept < len(desired) and song_id == desired[kept]: kept += 1
+        else: remove.append(index)
+    return remove, desired[kept:]
+
+def map_key(job):
+    """The key of a job in the stored playlist map: its persistent ID, or its name if the library has none."""
+    return job[3] or job[0]
+
+def match_server_playlists(jobs, server_playlists, stored_map):
+    """Picks the server playlist for each job: the one recorded for its persistent ID in an earlier sync if it still
+       exists, otherwise an unclaimed playlist of ours with the same name. None means it has to be created."""
+    by_id = {plist['id']: plist for plist in server_playlists}
+    by_name = {}
+    for plist in server_playlists:
+        if plist.get('owner', client.username) == client.username: by_name.setdefault(plist['name'], []).append(plist)
+    targets = [by_id.get(stored_map.get(map_key(job), (None,))[0]) for job in jobs]
+    claimed = {target['id'] for target in targets if target}
+    for number, (playlist_name, _, _, _) in enumerate(jobs):
+        if targets[number]: continue
+        targets[number] = next((plist for plist in by_name.get(playlist_name, ()) if plist['id'] not in claimed), None)
+        if targets[number]: claimed.add(targets[number]['id'])
+    return targets
+
+def sync_playlist(playlist_name, it_track_count, ND_track_ids, target, stored):
+    """Brings one server playlist in line with the iTunes playlist, creating it if there is none. Runs in a worker
+       thread. A playlist that neither side changed since the last sync costs no request at all.
+       Returns (status, lines, Navidrome playlist ID or None)."""
+    lines = []
+    log = lines.append
+    if target and stored and stored == (target['id'], playlist_digest(playlist_name, ND_track_ids), target.get('changed')):
+        return 'unchanged', lines, target['id']
+
+    log(f'\nSyncing playlist "{playlist_name}" ({it_track_count} tracks)...')
+    missing_songs_count = it_track_count - len(ND_track_ids)
+    if missing_songs_count > 0:
+        log(f"  - Warning: {missing_songs_count} song(s) will be skipped (not found in Navidrome library).")
+    if target is None:
+        if not ND_track_ids: log("  - No valid songs found for this playlist. Skipping."); return 'empty', lines, None
+        reply = client.request('createPlaylist', log=log, retry=False, name=playlist_name)
+        if not reply: log('  - ERROR: Failed to create playlist in Navidrome.'); return 'failed', lines, None
+        ND_playlist_id, current, status = reply['playlist']['id'], [], 'created'
+    else: ND_playlist_id, current, status = target['id'], None, 'updated'
+
+    rename, wrote = target is not None and target['name'] != playlist_name, False
+    for attempt in range(1, CHUNK_RETRIES + 1):
+        if current is None:
+            reply = client.request('getPlaylist', log=log, id=ND_playlist_id)
+            if not reply: log('  - ERROR: Could not read the playlist from Navidrome.'); return 'failed', lines, ND_playlist_id
+            current = [entry['id'] for entry in reply['playlist'].get('entry', [])]
+        remove, add = playlist_diff(current, ND_track_ids)
+        if not (remove or add or rename):
+            if wrote: break
+            log('  - Already up to date.'); return 'unchanged', lines, ND_playlist_id
+        if rename:
+            if not client.request('updatePlaylist', log=log, retry=False, playlistId=ND_playlist_id, name=playlist_name):
+                log('  - ERROR: Failed to rename the playlist.'); return 'failed', lines, ND_playlist_id
+            rename, wrote = False, True
+        if not remove: break
+        log(f'  - Removing {len(remove)} tracks...')
+        wrote = True
+        if remove_tracks(ND_playlist_id, remove, log): break
+        # Some batches may have gone through: read the playlist again and work out what is left to do.
+        current = None
+        if attempt < CHUNK_RETRIES: log(f'  - Reading the playlist again to retry ({attempt}/{CHUNK_RETRIES - 1})...')
+    else:
+        log('  - ERROR: Failed to remove tracks from the playlist.'); return 'failed', lines, ND_playlist_id
+    if add:
+        log(f'  - Adding {len(add)} tracks...')
+        failed_tracks = add_tracks(ND_playlist_id, add, log, start_count=len(current) - len(remove))
+        if failed_tracks: log(f'  - ERROR: {failed_tracks} of {len(add)} new tracks could not be added.'); return 'failed', lines, ND_playlist_id
+    log(f'  - SUCCESS: Playlist "{playlist_name}" {status}.')
+    return status, lines, ND_playlist_id
+
+def sync_playlists(playlists, lookup_many, workers, store):
+    """Syncs the playlists onto the server's existing playlists with a pool of worker threads, sending only the
+       differences. The iTunes -> Navidrome playlist map is kept in `store` (a CorrelationStore) for the next run.
+       Returns the counts of the summary."""
+    jobs = lookup_jobs(playlists, lookup_many)
+    summary = {'created': 0, 'updated': 0, 'unchanged': 0, 'empty': 0, 'failed': 0}
+    reply = client.request('getPlaylists')
+    if not reply:
+        print("ERROR: Could not read the playlists from Navidrome."); summary['failed'] = len(jobs); return summary
+    server_playlists = reply.get('playlists', {}).get('playlist', [])
+    stored_map = store.playlist_map()
+    targets = match_server_playlists(jobs, server_playlists, stored_map)
+
+    print(f"\nSyncing {len(jobs)} playlists using {workers} parallel connections...")
+    synced = {}  # map key -> (Navidrome playlist ID, digest, or None if the sync failed)
+    with metrics.phase('sync', len(jobs)), ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(sync_playlist, *job[:3], target, stored_map.get(map_key(job))) for job, target in zip(jobs, targets)]
+        for job, future in zip(jobs, futures):
+            status, lines, ND_playlist_id = future.result()
+            summary[status] += 1
+            if lines: print('\n'.join(lines))
+            if ND_playlist_id: synced[map_key(job)] = (ND_playlist_id, None if status == 'failed' else playlist_digest(job[0], job[2]))
+
+    # Every write bumps a playlist's 'changed' stamp; read the new stamps so the next run can skip these playlists.
+    if summary['created'] or summary['updated'] or summary['failed']:
+        reply = client.request('getPlaylists')
+        if reply: server_playlists = reply.get('playlists', {}).get('playlist', [])
+    changed = {plist['id']: plist.get('changed') for plist in server_playlists}
+    store.update_playlist_map({key: (ND_playlist_id, digest, changed.get(ND_playlist_id)) for key, (ND_playlist_id, digest) in synced.items()})
+
+    print("\n--- SYNC SUMMARY ---")
+    print(f"  Created:                     {summary['created']}")
+    print(f"  Updated:                     {summary['updated']}")
+    print(f"  Already up to date:          {summary['unchanged']}")
+    print(f"  Skipped (no matching songs): {summary['empty']}")
+    print(f"  Failed:                      {summary['failed']}")
+    return summary
+
+def import_playlists(db_path, playlists, lookup_many):
+    """Writes the playlists straight into Navidrome's playlist and playlist_tracks tables, in one transaction.
+       The rows look like the ones createPlaylist/updatePlaylist would produce: owned by the only user, tracks
+       numbered from 1 in playlist order, song count, duration and size summed over the tracks. Returns the
+       counts of the summary; if the transaction fails, nothing is written and every playlist counts as failed."""
+    jobs = lookup_jobs(playlists, lookup_many)
+    print(f"\nImporting {len(jobs)} playlists into {db_path}...")
+    summary = {'migrated': 0, 'partial': 0, 'empty': 0, 'failed': 0}
+    conn = sqlite3.connect(db_path, timeout=60)
+    try:
+        with metrics.phase('database-import', len(jobs)) as phase:
+            cur = conn.cursor()
+            cur.execute('BEGIN IMMEDIATE')  # Takes the write lock up front, so a running server can't interleave.
+            owner_id = itunestoND.determine_userID(cur)
+            songs = {song_id: (duration or 0, size or 0) for song_id, duration, size in cur.execute('SELECT id, duration, size FROM media_file')}
+            # Older Navidrome versions lack some columns (e.g. size, rules); only the ones present are filled in.
+            columns = {row[1] for row in cur.execute('PRAGMA table_info(playlist)')}
+            now = itunestoND.format_timestamp(time.time())
+            playlist_rows, track_rows = [], []
+            for playlist_name, it_track_count, ND_track_ids, _ in jobs:
+                ND_track_ids = [song_id for song_id in ND_track_ids if song_id in songs]  # Drops songs deleted since the last sync
+                if not ND_track_ids:
+                    print(f'"{playlist_name}": no valid songs found, skipped.'); summary['empty'] += 1; continue
+                playlist_id = str(uuid.uuid4())
+                row = {'id': playlist_id, 'name': playlist_name, 'comment': '', 'owner_id': owner_id, 'public': False,
+                       'song_count': len(ND_track_ids), 'duration': sum(songs[song_id][0] for song_id in ND_track_ids),
+                       'size': sum(songs[song_id][1] for song_id in ND_track_ids), 'created_at': now, 'updated_at': now,
+                       'path': '', 'sync': False}
+                playlist_rows.append({key: value for key, value in row.items() if key in columns})
+                track_rows.extend((position, playlist_id, song_id) for position, song_id in enumerate(ND_track_ids, 1))
+                missing_songs_count = it_track_count - len(ND_track_ids)
+                if missing_songs_count: print(f'"{playlist_name}": {len(ND_track_ids)} tracks, {missing_songs_count} song(s) skipped (not found in Navidrome library).')
+                summary['partial' if missing_songs_count else 'migrated'] += 1
+            for row in playlist_rows:
+                cur.execute(f"INSERT INTO playlist ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})", tuple(row.values()))
+            cur.executemany('INSERT INTO playlist_tracks (id, playlist_id, media_file_id) VALUES (?, ?, ?)', track_rows)
+            conn.commit()
+            phase.items += len(track_rows)
+        print(f"{len(playlist_rows)} playlists with {len(track_rows):,} tracks written.")
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"\nA database error occurred: {e}\nAll changes have been rolled back.")
+        summary = {'migrated': 0, 'partial': 0, 'empty': 0, 'failed': len(jobs)}
+    finally: conn.close()
+    print_summary(summary)
+    return summary
+
+def main():
+    global metrics
+    parser = argparse.ArgumentParser(description='Migrates iTunes playlists to Navidrome through the Subsonic API.')
+    parser.add_argument('--database', action='store_true', help="write the playlists straight into the navidrome.db from config.json instead of using the API")
+    parser.add_argument('--sync', action='store_true', help='update the playlists created by an earlier run (or with the same name) instead of creating new ones')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.database and args.sync: parser.error('--sync works through the API and cannot be combined with --database')
+    metrics = Metrics.from_args('itunesPlaylistMigrator.py', args)
+
+    with metrics.phase('pre-flight'): itunes_correlations = pre_flight_check()
+    if args.database:
+        with open(CONFIG_FILE, 'r') as f: config = json.load(f)
+        if not os.path.isfile(config.get('navidrome_db', '')):
+            print(f"ERROR: Could not find the Navidrome database at path in config.json: {config.get('navidrome_db')}"); sys.exit(1)
+    else:
+        config = get_full_configuration()
+        connect(config)
+
+    it_db_path = Path(config['itunes_xml'])
+    if not it_db_path.is_file():
+        print(f"ERROR: Could not find iTunes XML at path in config.json: {it_db_path}"); sys.exit(1)
+
+    print(f'\nUsing "{it_db_path}" for the iTunes library.')
+    print("Reading playlists from the XML file... this may take a moment for large libraries.")
+    valid_playlists = [plist for plist in metrics.timed_iter('xml-parse', ITunesLibrary(it_db_path, library_cache_path(CONFIG_FILE, config)).playlists()) if is_user_playlist(plist)]
+    print("Parsing complete.")
+
+    print(f"\nFound {len(valid_playlists)} user-created playlists in your library.")
+    if not valid_playlists:
+        print("No playlists to migrate. Exiting."); sys.exit(0)
+
+    migrate_all = pyip.inputYesNo(prompt='Do you want to migrate ALL of them automatically? (y/n) ')
+
+    if migrate_all == 'yes':
+        selected_playlists = valid_playlists
+    else:
+        print("\nOkay, I will ask you about each playlist individually.")
+        selected_playlists = []
+        for plist in valid_playlists:
+            playlist_name = plist.name
+            track_count = len(plist.track_ids)
+            should_migrate = pyip.inputYesNo(prompt=f'\nDo you want to migrate "{playlist_name}" ({track_count} tracks)? (y/n) ')
+            if should_migrate == 'yes':
+                selected_playlists.append(plist)
+
+    if args.database:
+        import_playlists(config['navidrome_db'], selected_playlists, itunes_correlations.lookup_many)
+    else:
+        workers = max(1, int(config.get('playlist_workers', DEFAULT_WORKERS)))
+        if args.sync: sync_playlists(selected_playlists, itunes_correlations.lookup_many, workers, itunes_correlations)
+        else: migrate_playlists(selected_playlists, itunes_correlations.lookup_many, workers)
+        print("\n--- API CALLS ---")
+        print('\n'.join(client.latency_report()))
+        metrics.record_api(client)
+    metrics.finish()
+    print("\nPlaylist migration finished.")
+
+if __name__ == '__main__':
+    main()
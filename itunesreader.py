@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+
+# itunesreader.py - Streaming reader for the iTunes Library XML (plist) file.
+# Used by itunestoND.py and itunesPlaylistMigrator.py. Instead of loading the whole document
+# into memory, the file is walked with lxml's incremental parser and one track (or playlist)
+# is handed out at a time. Every element is freed right after it has been decoded, so memory
+# use stays flat no matter how large the library is.
+# Optionally, fully read sections are kept in a small SQLite cache (LibraryCache), so re-running a
+# script on an unchanged library skips the XML parser altogether.
+
+import calendar, hashlib, json, os, sqlite3
+from array import array
+from urllib.parse import unquote
+from lxml import etree
+
+# Depth of the interesting elements: <plist> = 1, top-level <dict> = 2,
+# the 'Tracks' <dict> / 'Playlists' <array> = 3, a single track / playlist <dict> = 4.
+SECTION_DEPTH = 3
+RECORD_DEPTH = 4
+
+LIBRARY_CACHE_FILE = 'itunes_library_cache.db'
+CACHE_VERSION = '1'  # Bump when the cached layout or the decoding changes.
+CACHE_SAMPLE_BYTES = 1 << 20
+CACHE_BATCH_SIZE = 5000
+
+def _plist_value(elem):
+    """Converts a plist value element into the matching Python value."""
+    tag = elem.tag
+    if tag == 'integer': return int(elem.text)
+    if tag == 'real': return float(elem.text)
+    if tag == 'true': return True
+    if tag == 'false': return False
+    if tag == 'dict': return _plist_dict(elem)
+    if tag == 'array': return [_plist_value(child) for child in elem]
+    return elem.text or ''  # string, date, data
+
+def _plist_dict(elem):
+    """Converts a plist <dict> element into a Python dict in a single pass over its children."""
+    result, key = {}, None
+    for child in elem:
+        if child.tag == 'key': key = child.text
+        else: result[key] = _plist_value(child)
+    return result
+
+def parse_date(text):
+    """Converts an iTunes date ('2015-03-02T10:00:00Z') to UTC epoch seconds. Returns 0 if it can't be parsed."""
+    try: return calendar.timegm((int(text[0:4]), int(text[5:7]), int(text[8:10]), int(text[11:13]), int(text[14:16]), int(text[17:19])))
+    except (TypeError, ValueError): return 0
+
+class TrackRecord:
+    """A single library track, decoded once into fixed, typed fields.
+       Dates are UTC epoch seconds (0 if missing), the location is already URL-decoded."""
+    __slots__ = ('track_id', 'name', 'artist', 'album', 'location', 'total_time', 'rating',
+                 'play_count', 'play_date', 'date_added', 'date_modified')
+
+    def __init__(self):
+        self.track_id, self.name, self.artist, self.album, self.location = 0, '', '', '', None
+        self.total_time = self.rating = self.play_count = self.play_date = self.date_added = self.date_modified = 0
+
+    def __repr__(self): return f'<TrackRecord {self.track_id}: {self.artist} - {self.name}>'
+
+    def to_row(self): return tuple(getattr(self, attribute) for attribute in self.__slots__)
+
+    @classmethod
+    def from_row(cls, row):
+        track = cls.__new__(cls)
+        (track.track_id, track.name, track.artist, track.album, track.location, track.total_time, track.rating,
+         track.play_count, track.play_date, track.date_added, track.date_modified) = row
+        return track
+
+class PlaylistRecord:
+    """A single library playlist. `track_ids` is a compact array of iTunes track IDs in playlist order."""
+    __slots__ = ('name', 'persistent_id', 'parent_persistent_id', 'is_distinguished', 'is_smart', 'is_folder', 'track_ids')
+
+    def __init__(self):
+        self.name, self.persistent_id, self.parent_persistent_id = '', None, None
+        self.is_distinguished = self.is_smart = self.is_folder = False
+        self.track_ids = array('q')
+
+    def __repr__(self): return f'<PlaylistRecord {self.name!r} ({len(self.track_ids)} tracks)>'
+
+    def to_row(self):
+        return (self.name, self.persistent_id, self.parent_persistent_id, self.is_distinguished, self.is_smart,
+                self.is_folder, self.track_ids.tobytes())
+
+    @classmethod
+    def from_row(cls, row):
+        playlist = cls.__new__(cls)
+        playlist.name, playlist.persistent_id, playlist.parent_persistent_id = row[0], row[1], row[2]
+        playlist.is_distinguished, playlist.is_smart, playlist.is_folder = bool(row[3]), bool(row[4]), bool(row[5])
+        playlist.track_ids = array('q'); playlist.track_ids.frombytes(row[6])
+        return playlist
+
+# plist key -> (record attribute, decoder). Keys that are not listed are skipped without being decoded.
+TRACK_FIELDS = {
+    'Track ID': ('track_id', int), 'Name': ('name', str), 'Artist': ('artist', str), 'Album': ('album', str),
+    'Location': ('location', unquote), 'Total Time': ('total_time', int), 'Rating': ('rating', int),
+    'Play Count': ('play_count', int), 'Play Date UTC': ('play_date', parse_date),
+    'Date Added': ('date_added', parse_date), 'Date Modified': ('date_modified', parse_date),
+}
+
+def decode_track(elem):
+    """Decodes a track <dict> element into a TrackRecord in a single pass over its children."""
+    track, field = TrackRecord(), None
+    for child in elem:
+        if child.tag == 'key': field = TRACK_FIELDS.get(child.text)
+        elif field is not None:
+            attribute, decoder = field
+            setattr(track, attribute, decoder(child.text or ''))
+            field = None
+    return track
+
+def decode_playlist(elem):
+    """Decodes a playlist <dict> element into a PlaylistRecord in a single pass over its children."""
+    playlist, key = PlaylistRecord(), None
+    for child in elem:
+        if child.tag == 'key': key = child.text; continue
+        if key == 'Name': playlist.name = child.text or ''
+        elif key == 'Playlist Persistent ID': playlist.persistent_id = child.text
+        elif key == 'Parent Persistent ID': playlist.parent_persistent_id = child.text
+        elif key == 'Distinguished Kind' or key == 'Master': playlist.is_distinguished = True
+        elif key == 'Smart Info': playlist.is_smart = True
+        elif key == 'Folder': playlist.is_folder = child.tag == 'true'
+        elif key == 'Playlist Items':
+            # Every item is <dict><key>Track ID</key><integer>...</integer></dict>.
+            playlist.track_ids.extend(int(item[1].text) for item in child if len(item) > 1)
+    return playlist
+
+def _free(elem):
+    """Releases an element and every already-processed sibling before it."""
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None: del parent[0]
+
+def file_fingerprint(path):
+    """(size, mtime in ns, hash of the first, middle and last MB) - cheap to compute, even for huge files."""
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for offset in sorted({0, max(0, stat.st_size // 2 - CACHE_SAMPLE_BYTES // 2), max(0, stat.st_size - CACHE_SAMPLE_BYTES)}):
+            f.seek(offset); digest.update(f.read(CACHE_SAMPLE_BYTES))
+    return stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 22), b''): digest.update(chunk)
+    return digest.hexdigest()
+
+def library_cache_path(config_file, config):
+    """Where the parsed library is cached: next to config.json, unless 'library_cache' is false in it."""
+    if config.get('library_cache', True) is False: return None
+    return os.path.join(os.path.dirname(os.path.abspath(config_file)), LIBRARY_CACHE_FILE)
+
+class LibraryCache:
+    """The decoded tracks and playlists of one iTunes XML file, stored in SQLite.
+
+    Entries are keyed by the XML's size, modification time and a sampled hash. If only the modification
+    time changed (the file was touched or copied), a hash of the whole content decides whether the cache
+    is still valid. The cache holds a single library: when the XML changes, the file is recreated, so it
+    never grows beyond one decoded copy. Each section is only marked complete after it was read to the end.
+    """
+
+    TABLES = {'Tracks': ('tracks', 11), 'Playlists': ('playlists', 7)}
+
+    def __init__(self, path, xml_path):
+        self.path = path
+        size, mtime, sample = file_fingerprint(xml_path)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        meta = dict(self.conn.execute('SELECT key, value FROM meta'))
+        valid = meta.get('version') == CACHE_VERSION and meta.get('size') == str(size) and meta.get('sample') == sample
+        if valid and meta.get('mtime') != str(mtime):
+            valid = meta.get('content') == content_hash(xml_path)
+            if valid: self._set_meta(mtime=mtime); self.conn.commit()
+        if not valid: self._reset(size, mtime, sample, content_hash(xml_path))
+        self.pending = []
+
+    def _set_meta(self, **values):
+        self.conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', ((key, str(value)) for key, value in values.items()))
+
+    def _reset(self, size, mtime, sample, content):
+        self.conn.close()
+        if os.path.exists(self.path): os.remove(self.path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.execute('CREATE TABLE tracks (track_id INTEGER, name TEXT, artist TEXT, album TEXT, location TEXT, total_time INTEGER, '
+                          'rating INTEGER, play_count INTEGER, play_date INTEGER, date_added INTEGER, date_modified INTEGER)')
+        self.conn.execute('CREATE TABLE playlists (name TEXT, persistent_id TEXT, parent_persistent_id TEXT, is_distinguished INTEGER, '
+                          'is_smart INTEGER, is_folder INTEGER, track_ids BLOB)')
+        self._set_meta(version=CACHE_VERSION, size=size, mtime=mtime, sample=sample, content=content)
+        self.conn.commit()
+
+    def close(self): self.conn.close()
+
+    def complete(self, section):
+        return self.conn.execute('SELECT 1 FROM meta WHERE key = ?', (f'complete:{section}',)).fetchone() is not None
+
+    def header(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'header'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def read(self, section):
+        table, _ = self.TABLES[section]
+        record_class = TrackRecord if section == 'Tracks' else PlaylistRecord
+        for row in self.conn.execute(f'SELECT * FROM {table} ORDER BY rowid'): yield record_class.from_row(row)
+
+    def begin(self, section):
+        self.conn.execute(f'DELETE FROM {self.TABLES[section][0]}')
+        self.pending = []
+
+    def add(self, section, record):
+        self.pending.append(record.to_row())
+        if len(self.pending) >= CACHE_BATCH_SIZE: self._flush(section)
+
+    def _flush(self, section):
+        table, columns = self.TABLES[section]
+        self.conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * columns)})", self.pending)
+        self.pending = []
+
+    def finish(self, section, header):
+        self._flush(section)
+        self._set_meta(**{f'complete:{section}': 1, 'header': json.dumps(header)})
+        self.conn.commit()
+
+    def abandon(self):
+        """Drops the rows of a section that was not read to the end."""
+        self.pending = []; self.conn.rollback()
+
+class ITunesLibrary:
+    """Streaming access to an iTunes Library XML file.
+
+    The top-level values ('Music Folder', 'Library Persistent ID', ...) are collected into
+    `header` while reading. Tracks are yielded as TrackRecord and playlists as PlaylistRecord objects.
+    With a `cache_path`, sections that were read completely once are served from a LibraryCache
+    for as long as the XML file is unchanged. The cache is only opened on the first read, so a missing
+    XML file is reported by whoever reads it first (e.g. the pre-flight check).
+    """
+
+    def __init__(self, path, cache_path=None):
+        self.path, self.cache_path = path, cache_path
+        self.header = {}
+        self._cache = None
+
+    @property
+    def cache(self):
+        """The LibraryCache, opened on first use. None without a cache_path or while the XML file doesn't exist."""
+        if self._cache is None and self.cache_path and os.path.isfile(self.path): self._cache = LibraryCache(self.cache_path, self.path)
+        return self._cache
+
+    def items(self, sections=('Tracks', 'Playlists')):
+        """Yields ('track', record) and ('playlist', record) tuples in file order.
+           Stops reading as soon as all requested sections have been passed."""
+        if self.cache and all(self.cache.complete(section) for section in sections) and self.cache.header() is not None:
+            self.header.update(self.cache.header())
+            for section in ('Tracks', 'Playlists'):
+                if section not in sections: continue
+                kind = 'track' if section == 'Tracks' else 'playlist'
+                for record in self.cache.read(section): yield kind, record
+            return
+        yield from self._parse(sections)
+
+    def _parse(self, sections):
+        remaining = set(sections)
+        # Requested sections that aren't cached yet are stored on the way, once they have been read to the end.
+        to_cache = {section for section in sections if self.cache and not self.cache.complete(section)}
+        depth, last_key, section = 0, None, None
+        try:
+            with open(self.path, 'rb') as f:
+                for event, elem in etree.iterparse(f, events=('start', 'end'), huge_tree=True):
+                    if event == 'start':
+                        depth += 1
+                        if depth == SECTION_DEPTH and elem.tag in ('dict', 'array'):
+                            section = last_key
+                            if not remaining: return
+                            if section in to_cache: self.cache.begin(section)
+                        continue
+
+                    if depth == RECORD_DEPTH and elem.tag == 'dict' and section in remaining:
+                        if section == 'Tracks': kind, record = 'track', decode_track(elem)
+                        else: kind, record = 'playlist', decode_playlist(elem)
+                        _free(elem)
+                        if section in to_cache: self.cache.add(section, record)
+                        yield kind, record
+                    elif depth == RECORD_DEPTH:
+                        _free(elem)
+                    elif depth == SECTION_DEPTH:
+                        if elem.tag == 'key': last_key = elem.text
+                        elif elem.tag in ('dict', 'array'):
+                            if section in to_cache: self.cache.finish(section, self.header)
+                            remaining.discard(section); section = None
+                        else: self.header[last_key] = _plist_value(elem)
+                        _free(elem)
+                        if section is None and not remaining and elem.tag in ('dict', 'array'): return
+                    depth -= 1
+        finally:
+            if self.cache: self.cache.abandon()
+
+    def tracks(self):
+        """Yields one TrackRecord at a time."""
+        for _, track in self.items(sections=('Tracks',)): yield track
+
+    def playlists(self):
+        """Yields one PlaylistRecord at a time."""
+        for _, playlist in self.items(sections=('Playlists',)): yield playlist
+
+    def read_header(self):
+        """Reads only the top-level values that appear before the 'Tracks' section."""
+        for _ in self.items(sections=()): pass
+        return self.header
+
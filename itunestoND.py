@@ -4,13 +4,22 @@
 # from an iTunes library to the Navidrome database.
 # FINAL, DEFINITIVE VERSION 17 - Includes Album Timestamp Synchronization.
 
-import sys, sqlite3, datetime, re, string, pprint, random, json, os
+import sys, sqlite3, datetime, re, string, random, json, os, unicodedata, argparse, time, shutil
 from pathlib import Path
 from urllib.parse import unquote
 from urllib.request import pathname2url
-from bs4 import BeautifulSoup
+from itunesreader import ITunesLibrary, library_cache_path
+from correlationstore import CorrelationStore, CORRELATION_FILE
+from metrics import Metrics, add_metrics_arguments
 
 CONFIG_FILE = 'config.json'
+CHECKPOINT_FILE = 'itunes_checkpoint.db'  # Per-song state of the last run, used for incremental syncs.
+STATUS_INTERVAL = 10000  # Print a progress line every this many songs.
+
+# Settings for the private working copy used in bulk-write mode. Nothing else reads that copy while we
+# write, so journaling and fsyncs can be switched off: if anything fails, the copy is simply thrown away.
+BULK_WRITE_PRAGMAS = ('PRAGMA journal_mode = OFF', 'PRAGMA synchronous = OFF',
+                      'PRAGMA cache_size = -262144', 'PRAGMA temp_store = MEMORY')
 
 def get_configuration():
     if os.path.exists(CONFIG_FILE):
@@ -35,11 +44,54 @@ def get_configuration():
     print(f"\nConfiguration saved to {CONFIG_FILE}.")
     return config
 
-def pre_flight_check(config, soup):
+def relative_song_path(song_path_url, music_folder_url):
+    """Strips the iTunes music folder prefix from a decoded song URL. Returns None for songs outside of it."""
+    prefix = song_path_url[:len(music_folder_url)]
+    if prefix.lower() != music_folder_url.lower(): return None
+    return song_path_url[len(music_folder_url):].lstrip('/').replace('\\', '/')
+
+def unify_separators(path): return re.sub(r'/+', '/', path.replace('\\', '/')).strip('/')
+
+# Each tier is tried in order until a path matches: exact, then with unified separators,
+# then Unicode-normalized (macOS stores decomposed NFD names, Windows composed NFC), then casefolded.
+PATH_NORMALIZERS = (
+    lambda path: path,
+    unify_separators,
+    lambda path: unicodedata.normalize('NFC', unify_separators(path)),
+    lambda path: unicodedata.normalize('NFC', unify_separators(path)).casefold(),
+)
+
+class MediaFileIndex:
+    """In-memory hash index over media_file, so matching a song costs a dict lookup instead of a query."""
+
+    def __init__(self, cursor):
+        self.tiers = [{} for _ in PATH_NORMALIZERS]
+        self.tier_hits = [0] * len(PATH_NORMALIZERS)
+        cursor.execute('SELECT path, id, artist_id, album_id FROM media_file')
+        for path, *row in cursor:
+            row = tuple(row)
+            for tier, normalize in zip(self.tiers, PATH_NORMALIZERS): tier.setdefault(normalize(path), row)
+
+    def __len__(self): return len(self.tiers[0])
+
+    def find(self, relative_path):
+        """Returns ((id, artist_id, album_id), tier) for a relative path, or (None, None) if no tier matches."""
+        for level, (tier, normalize) in enumerate(zip(self.tiers, PATH_NORMALIZERS)):
+            row = tier.get(normalize(relative_path))
+            if row: return row, level
+        return None, None
+
+    def lookup(self, relative_path):
+        """Like find(), but only returns the row and counts which tier matched."""
+        row, level = self.find(relative_path)
+        if row: self.tier_hits[level] += 1
+        return row
+
+def pre_flight_check(config, library):
     print("\n--- Starting Pre-flight Check ---")
     
     checks = { "navidrome_db_found": False, "itunes_xml_found": False, "music_folder_key_found": False, "sample_song_found_in_xml": False, "song_found_in_navidrome_db": False }
-    itunes_music_folder_url = None
+    itunes_music_folder_url, media_index = None, None
     
     if os.path.isfile(config['navidrome_db']): checks['navidrome_db_found'] = True; print(f"[OK]   Navidrome DB found at: {config['navidrome_db']}")
     else: print(f"[FAIL] Navidrome DB not found.")
@@ -47,19 +99,18 @@ def pre_flight_check(config, soup):
     else: print(f"[FAIL] iTunes XML not found.")
 
     if checks['itunes_xml_found']:
-        music_folder_key = soup.find('key', text='Music Folder')
-        if music_folder_key:
-            base_path_url = unquote(music_folder_key.next_sibling.text)
+        music_folder = library.read_header().get('Music Folder')
+        if music_folder:
+            base_path_url = unquote(music_folder)
             itunes_music_folder_url = base_path_url + 'Music/'
             checks['music_folder_key_found'] = True
             print(f"[OK]   Auto-detected iTunes base path as: {base_path_url}")
             print(f"[OK]   Adjusted Music Folder path is: {itunes_music_folder_url}")
             
-            all_songs = soup.dict.dict.find_all('dict')
             sample_song_url = None
-            for song_entry in reversed(all_songs):
-                if song_entry.find('key', string='Location'):
-                    location_url = unquote(song_entry.find('key', string='Location').next_sibling.text)
+            for song_entry in library.tracks():
+                if song_entry.location:
+                    location_url = song_entry.location
                     if location_url.lower().startswith(itunes_music_folder_url.lower()):
                         sample_song_url = location_url; checks['sample_song_found_in_xml'] = True
                         print(f"[OK]   Found sample song in XML: {sample_song_url}"); break
@@ -67,19 +118,18 @@ def pre_flight_check(config, soup):
         else: print("[FAIL] Could not find the 'Music Folder' key in your iTunes XML.")
 
     if checks['navidrome_db_found'] and checks['sample_song_found_in_xml']:
-        relative_path = re.sub(re.escape(itunes_music_folder_url), '', sample_song_url, flags=re.IGNORECASE).lstrip('/').replace('\\', '/')
+        relative_path = relative_song_path(sample_song_url, itunes_music_folder_url)
         print(f"       - Calculated relative path for check: {relative_path}")
         
         conn = sqlite3.connect(config['navidrome_db'])
-        cur = conn.cursor()
-        cur.execute('SELECT id FROM media_file WHERE path = ?', (relative_path,))
-        result = cur.fetchone()
+        media_index = MediaFileIndex(conn.cursor())
         conn.close()
+        print(f"       - Indexed {len(media_index):,} songs from the Navidrome database.")
         
-        if result: checks['song_found_in_navidrome_db'] = True; print(f"[OK]   SUCCESS! Found a matching song in the Navidrome database.")
+        if media_index.find(relative_path)[0]: checks['song_found_in_navidrome_db'] = True; print(f"[OK]   SUCCESS! Found a matching song in the Navidrome database.")
         else: print(f"[FAIL] Could not find a matching song in the Navidrome database.")
     
-    if all(checks.values()): print("\n--- Pre-flight Check Passed ---\n"); return itunes_music_folder_url
+    if all(checks.values()): print("\n--- Pre-flight Check Passed ---\n"); return itunes_music_folder_url, media_index
     else: print("\n--- PRE-FLIGHT CHECK FAILED ---"); sys.exit(1)
 
 def determine_userID(cursor):
@@ -88,129 +138,264 @@ def determine_userID(cursor):
     if len(users) == 1: print(f'Changes will be applied to the {users[0][1]} Navidrome account.'); return users[0][0]
     else: raise Exception('There needs to be exactly one user account set up with Navidrome.')
 
+def format_timestamp(epoch_seconds):
+    """Formats UTC epoch seconds the way Navidrome stores timestamps. 0 (never) becomes year 1."""
+    if not epoch_seconds: moment = datetime.datetime.fromordinal(1)
+    else: moment = datetime.datetime.fromtimestamp(epoch_seconds, datetime.timezone.utc)
+    return moment.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + "+00:00"
+
 def update_playstats(d1, id, playcount, playdate, rating=0):
     d1.setdefault(id, {}); d1[id].setdefault('play count', 0)
-    d1[id].setdefault('play date', datetime.datetime.fromordinal(1))
+    d1[id].setdefault('play date', 0)
     d1[id]['play count'] += playcount; d1[id]['rating'] = rating
     if playdate > d1[id]['play date']: d1[id].update({'play date': playdate})
 
-def write_to_annotation(cursor, dictionary_with_stats, entry_type, user_id):
+def load_checkpoint(path):
+    """Returns the per-song state saved by the previous run as {itunes_id: (play_count, rating, play_date, date_modified)}.
+       Returns None if there is no usable checkpoint."""
+    if not os.path.isfile(path): return None
+    conn = sqlite3.connect(path)
+    try: return {row[0]: tuple(row[1:]) for row in conn.execute('SELECT itunes_id, play_count, rating, play_date, date_modified FROM track_state')}
+    except sqlite3.Error: return None
+    finally: conn.close()
+
+def save_checkpoint(path, track_states, replace=False):
+    """Stores the state of the songs that were written. With replace=True the previous checkpoint is discarded first."""
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute('CREATE TABLE IF NOT EXISTS track_state (itunes_id INTEGER PRIMARY KEY, play_count INTEGER, rating INTEGER, play_date INTEGER, date_modified INTEGER)')
+        if replace: conn.execute('DELETE FROM track_state')
+        conn.executemany('INSERT OR REPLACE INTO track_state VALUES (?, ?, ?, ?, ?)', ((itunes_id, *state) for itunes_id, state in track_states.items()))
+    conn.close()
+
+def open_bulk_copy(db_path):
+    """Copies the Navidrome database with SQLite's backup API (which also picks up pending WAL content)
+       and opens the copy tuned for bulk writes. Returns (connection, path of the copy)."""
+    work_path = db_path.with_name(db_path.name + '.migrating')
+    if work_path.exists(): work_path.unlink()
+    source, conn = sqlite3.connect(db_path), sqlite3.connect(work_path)
+    try: source.backup(conn)
+    finally: source.close()
+    for pragma in BULK_WRITE_PRAGMAS: conn.execute(pragma)
+    return conn, work_path
+
+def swap_in_bulk_copy(conn, work_path, db_path):
+    """Checks the integrity of the written copy and atomically renames it over the original database.
+       Closes the connection. Returns True if the original database was replaced."""
+    original = sqlite3.connect(db_path)
+    journal_mode = original.execute('PRAGMA journal_mode').fetchone()[0]
+    original.close()
+    conn.execute(f'PRAGMA journal_mode = {journal_mode}')  # Navidrome runs its database in WAL mode; keep it that way.
+    print("Running an integrity check on the updated copy...")
+    result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+    conn.close()
+    if result != 'ok':
+        print(f"Integrity check FAILED ({result}). The original database was left untouched."); return False
+    wal_path = db_path.with_name(db_path.name + '-wal')
+    if wal_path.exists() and wal_path.stat().st_size > 0:
+        # Swapping the copy in by hand would skip the checkpoint and double-count plays on the next incremental run.
+        print(f"'{wal_path}' contains unsaved changes, so Navidrome still seems to be running. The original database was left untouched.")
+        print("Stop Navidrome and run the migration again, or set \"bulk_write\": false in config.json to write to the live database."); return False
+    # The copy was created by this process; give it the original's mode and owner, or Navidrome may not be able to write to it.
+    shutil.copymode(db_path, work_path)
+    original_stat, copy_stat = os.stat(db_path), os.stat(work_path)
+    if hasattr(os, 'chown') and (copy_stat.st_uid, copy_stat.st_gid) != (original_stat.st_uid, original_stat.st_gid):
+        try: os.chown(work_path, original_stat.st_uid, original_stat.st_gid)
+        except PermissionError:
+            print(f"'{db_path}' belongs to another user, so the updated copy could not take over its owner. The original database was left untouched.")
+            print("Run the migration as that user (or root), or set \"bulk_write\": false in config.json."); return False
+    os.replace(work_path, db_path)
+    return True
+
+def sync_album_timestamps(cursor, album_ids):
+    """Sets each album's 'Date Added' to that of its earliest song, for the given albums only.
+       The per-album minimum is computed once with a grouped aggregate instead of per column and row."""
+    cursor.execute('CREATE TEMP TABLE touched_album (id TEXT PRIMARY KEY)')
+    cursor.executemany('INSERT OR IGNORE INTO touched_album VALUES (?)', ((album_id,) for album_id in album_ids))
+    cursor.execute('CREATE TEMP TABLE album_first_added (album_id TEXT PRIMARY KEY, first_added DATETIME)')
+    cursor.execute("""
+        INSERT INTO album_first_added
+        SELECT album_id, MIN(created_at) FROM media_file
+        WHERE album_id IN (SELECT id FROM touched_album) GROUP BY album_id""")
+    cursor.execute("""
+        UPDATE album SET (created_at, updated_at, imported_at) =
+            (SELECT first_added, first_added, first_added FROM album_first_added WHERE album_first_added.album_id = album.id)
+        WHERE id IN (SELECT album_id FROM album_first_added)""")
+    synchronized = cursor.rowcount
+    cursor.execute('DROP TABLE touched_album'); cursor.execute('DROP TABLE album_first_added')
+    return synchronized
+
+# Incremental runs add the play count *difference* since the last run to whatever Navidrome already has,
+# so plays recorded by Navidrome in the meantime are kept. Ratings are only taken over for songs.
+ANNOTATION_MERGE_QUERY = """
+INSERT INTO annotation (user_id, item_id, item_type, play_count, play_date, rating, starred, starred_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, item_id, item_type) DO UPDATE SET
+    play_count = MAX(0, annotation.play_count + excluded.play_count),
+    play_date = MAX(COALESCE(annotation.play_date, ''), excluded.play_date),
+    rating = CASE WHEN excluded.item_type = 'media_file' THEN excluded.rating ELSE annotation.rating END
+"""
+
+def write_to_annotation(cursor, dictionary_with_stats, entry_type, user_id, merge=False):
     annotation_entries = []
     for item_id in dictionary_with_stats:
         this_entry = dictionary_with_stats[item_id]
         play_count = this_entry['play count']
-        play_date = this_entry['play date'].strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + "+00:00"
+        play_date = format_timestamp(this_entry['play date'])
         rating_value = this_entry.get('rating', 0)
         starred_value = 0
         annotation_entries.append((user_id, item_id, entry_type, play_count, play_date, rating_value, starred_value, None))
     
-    cursor.executemany('INSERT INTO annotation (user_id, item_id, item_type, play_count, play_date, rating, starred, starred_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', annotation_entries)
-
-# --- Main script starts here ---
-print()
-print('This script will migrate ratings, play counts, AND timestamps from your ITunes library to your Navidrome database.')
-_ = input('\nAre you sure you want to continue? (y/n): ').lower()
-if _ != 'y': print('Good bye.'); sys.exit(0)
-
-config = get_configuration()
-nddb_path, itdb_path = Path(config['navidrome_db']), Path(config['itunes_xml'])
-print('\nParsing Itunes library. This may take a while.')
-with open(itdb_path, 'r', encoding="utf-8") as f: soup = BeautifulSoup(f, 'lxml-xml')
-
-it_root_music_path_url = pre_flight_check(config, soup)
-songs = soup.dict.dict.find_all('dict'); song_count = len(songs)
-print(f'Found {song_count:,} files in Itunes database to process.')
-del(soup)
-
-conn = None
-try:
-    conn = sqlite3.connect(nddb_path)
-    cur = conn.cursor()
-    userID = determine_userID(cur)
-    songID_correlation, artists, albums, files, timestamp_updates = {}, {}, {}, {}, []
-    cur.execute('DELETE FROM annotation'); print("Old annotations cleared.")
-    status_interval = song_count // 8 if song_count > 0 else 1
-    counter = 0
-
-    print("Processing all songs to gather data...")
-    for it_song_entry in songs:
-        counter += 1
-        if counter % status_interval == 0:
-            print(f'{counter:,} files parsed so far of {song_count:,} total songs.')
-
-        if it_song_entry.find('key', string='Location') == None: continue
-        song_path_url = unquote(it_song_entry.find('key', string='Location').next_sibling.text)
-        if not song_path_url.lower().startswith(it_root_music_path_url.lower()): continue   
-        
-        relative_path = re.sub(re.escape(it_root_music_path_url), '', song_path_url, flags=re.IGNORECASE).lstrip('/').replace('\\', '/')
-        
-        try:
-            cur.execute('SELECT id, artist_id, album_id FROM media_file WHERE path = ?', (relative_path,))
-            song_id, artist_id, album_id = cur.fetchone()
-        except TypeError: continue
-
-        it_song_ID = int(it_song_entry.find('key', string='Track ID').next_sibling.text)
-        songID_correlation.update({it_song_ID: song_id})
-
-        try:
-            date_added_str = it_song_entry.find('key', string='Date Added').next_sibling.text[:-1]
-            date_added_obj = datetime.datetime.strptime(date_added_str, '%Y-%m-%dT%H:%M:%S')
-            formatted_date = date_added_obj.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + "+00:00"
-            timestamp_updates.append((formatted_date, formatted_date, formatted_date, song_id))
-        except AttributeError: pass
-        
-        try:
-            song_rating = int(int(it_song_entry.find('key', string='Rating').next_sibling.text) / 20)
-        except AttributeError: song_rating = 0
+    if merge: cursor.executemany(ANNOTATION_MERGE_QUERY, annotation_entries)
+    else:
+        cursor.executemany('INSERT INTO annotation (user_id, item_id, item_type, play_count, play_date, rating, starred, starred_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', annotation_entries)
+
+def sync_tracks(config, tracks, music_folder_url, media_index, previous_states, metrics, checkpoint_path=CHECKPOINT_FILE):
+    """Writes the ratings, play counts and timestamps of the streamed iTunes tracks to navidrome.db.
+       With previous_states (from the checkpoint) only changed songs are synced and merged into Navidrome's
+       own counts. Returns the {iTunes track ID: Navidrome song ID} map of the matched songs, whether the
+       changes were committed and whether the whole library was read (otherwise the map is partial)."""
+    nddb_path, incremental = Path(config['navidrome_db']), bool(previous_states)
+    previous_states = previous_states or {}
+    bulk_write = config.get('bulk_write', True)
+    conn, work_path, songID_correlation, committed, complete = None, None, {}, False, False
+    try:
+        if bulk_write:
+            print("\nBulk-write mode: changes are written to a copy of the database, which replaces the original at the end.")
+            with metrics.phase('bulk-copy'): conn, work_path = open_bulk_copy(nddb_path)
+        else: conn = sqlite3.connect(nddb_path)
+        cur = conn.cursor()
+        userID = determine_userID(cur)
+        artists, albums, files, timestamp_updates, touched_albums = {}, {}, {}, [], set()
+        if incremental: print("Incremental mode: existing annotations will be merged.")
+        else: cur.execute('DELETE FROM annotation'); print("Old annotations cleared.")
+        changed_states = {}
+        counter, unmatched, unchanged = 0, 0, 0
+
+        print("Streaming the Itunes library and processing all songs. This may take a while.")
+        loop_started = time.perf_counter()
+        for it_song_entry in metrics.timed_iter('xml-parse', tracks):
+            counter += 1
+            if counter % STATUS_INTERVAL == 0:
+                print(f'{counter:,} files parsed so far.')
+
+            if not it_song_entry.location: continue
+            relative_path = relative_song_path(it_song_entry.location, music_folder_url)
+            if relative_path is None: continue
             
-        try:
-            play_count = int(it_song_entry.find('key', string='Play Count').next_sibling.text)
-            last_played = datetime.datetime.strptime(it_song_entry.find('key', string='Play Date UTC').next_sibling.text[:-1], '%Y-%m-%dT%H:%M:%S')
-        except AttributeError:
-            play_count = 0; last_played = datetime.datetime.fromordinal(1)
-
-        update_playstats(artists, artist_id, play_count, last_played)
-        update_playstats(albums, album_id, play_count, last_played)
-        update_playstats(files, song_id, play_count, last_played, rating=song_rating)
-
-    print(f"\nUpdating song timestamps for {len(timestamp_updates):,} songs...")
-    cur.executemany('UPDATE media_file SET created_at = ?, updated_at = ?, birth_time = ? WHERE id = ?', timestamp_updates)
-    print("Song timestamp migration complete.")
-
-    print('Writing ratings and play counts to annotation table:')
-    write_to_annotation(cur, artists, 'artist', userID)
-    write_to_annotation(cur, files, 'media_file', userID)
-    write_to_annotation(cur, albums, 'album', userID)
-    print('Annotation data written.')
-
-    # --- NEW: Final step to synchronize album 'Date Added' timestamps ---
-    print("\nSynchronizing album timestamps...")
-    album_sync_query = """
-    UPDATE album
-    SET 
-        created_at = (SELECT MIN(created_at) FROM media_file WHERE media_file.album_id = album.id),
-        updated_at = (SELECT MIN(created_at) FROM media_file WHERE media_file.album_id = album.id),
-        imported_at = (SELECT MIN(created_at) FROM media_file WHERE media_file.album_id = album.id)
-    WHERE EXISTS (
-        SELECT 1 FROM media_file WHERE media_file.album_id = album.id
-    );
-    """
-    cur.execute(album_sync_query)
-    print(f"{cur.rowcount} album timestamps were synchronized.")
-
-    conn.commit()
-    print("\nAll database changes have been successfully committed.")
-
-except sqlite3.Error as e:
-    print(f"\nA database error occurred: {e}");
-    if conn: conn.rollback(); print("All changes have been rolled back.")
-finally:
-    if conn: conn.close(); print("Database connection closed.")
-
-with open('IT_file_correlations.py', 'w') as f:
-    f.write('# iTunes to Navidrome song ID correlations.\n')
-    f.write('itunes_correlations = ')
-    f.write(pprint.pformat(songID_correlation))
-
-print('File correlation index saved.')
-print('\nMigration script finished.')
\ No newline at end of file
+            media_file = media_index.lookup(relative_path)
+            if media_file is None: unmatched += 1; continue
+            song_id, artist_id, album_id = media_file
+
+            songID_correlation.update({it_song_entry.track_id: song_id})
+
+            song_rating = int(it_song_entry.rating / 20)
+            # A play count only counts if iTunes also knows when the song was last played.
+            play_count = it_song_entry.play_count if it_song_entry.play_date else 0
+            last_played = it_song_entry.play_date if play_count else 0
+
+            state = (play_count, song_rating, last_played, it_song_entry.date_modified)
+            previous = previous_states.get(it_song_entry.track_id)
+            if previous == state: unchanged += 1; continue
+            changed_states[it_song_entry.track_id] = state
+
+            if previous is None and it_song_entry.date_added:
+                formatted_date = format_timestamp(it_song_entry.date_added)
+                timestamp_updates.append((formatted_date, formatted_date, formatted_date, song_id))
+                touched_albums.add(album_id)
+            if previous is not None: play_count -= previous[0]
+
+            update_playstats(artists, artist_id, play_count, last_played)
+            update_playstats(albums, album_id, play_count, last_played)
+            update_playstats(files, song_id, play_count, last_played, rating=song_rating)
+        complete = True
+
+        # The loop's own work (path matching and state diffing) is whatever the parser didn't take.
+        metrics.record('match-loop', time.perf_counter() - loop_started - metrics.get('xml-parse').seconds, counter)
+        print(f'Finished processing {counter:,} files from the Itunes database.')
+        exact, separators, unicode_form, casefolded = media_index.tier_hits
+        print(f'Matched {exact:,} songs exactly and {separators + unicode_form + casefolded:,} after normalizing '
+              f'separators ({separators:,}), Unicode form ({unicode_form:,}) or case ({casefolded:,}).')
+        if unmatched: print(f'{unmatched:,} songs could not be found in the Navidrome database and were skipped.')
+        if incremental: print(f'{len(changed_states):,} songs changed since the last run, {unchanged:,} unchanged songs were skipped.')
+
+        print(f"\nUpdating song timestamps for {len(timestamp_updates):,} songs...")
+        with metrics.phase('timestamp-writes', len(timestamp_updates)):
+            cur.executemany('UPDATE media_file SET created_at = ?, updated_at = ?, birth_time = ? WHERE id = ?', timestamp_updates)
+        print("Song timestamp migration complete.")
+
+        print('Writing ratings and play counts to annotation table:')
+        with metrics.phase('annotation-writes', len(artists) + len(files) + len(albums)):
+            write_to_annotation(cur, artists, 'artist', userID, merge=incremental)
+            write_to_annotation(cur, files, 'media_file', userID, merge=incremental)
+            write_to_annotation(cur, albums, 'album', userID, merge=incremental)
+            # The upsert clamps merged rows; only a negative delta for an item without annotation can be left below 0.
+            if incremental: cur.execute('UPDATE annotation SET play_count = 0 WHERE play_count < 0')
+        print('Annotation data written.')
+
+        # --- Final step to synchronize album 'Date Added' timestamps of the albums whose songs were updated ---
+        print(f"\nSynchronizing album timestamps for {len(touched_albums):,} albums...")
+        with metrics.phase('album-sync', len(touched_albums)):
+            print(f"{sync_album_timestamps(cur, touched_albums)} album timestamps were synchronized.")
+
+        with metrics.phase('commit'):
+            conn.commit()
+            committed = True
+            if bulk_write:
+                committed = swap_in_bulk_copy(conn, work_path, nddb_path); conn = None
+        if committed:
+            print("\nAll database changes have been successfully committed.")
+            with metrics.phase('checkpoint-save', len(changed_states)):
+                save_checkpoint(checkpoint_path, changed_states, replace=not incremental)
+            print(f"Checkpoint for the next incremental sync saved to {checkpoint_path}.")
+
+    except sqlite3.Error as e:
+        print(f"\nA database error occurred: {e}");
+        if conn and not bulk_write: conn.rollback(); print("All changes have been rolled back.")
+    finally:
+        if conn: conn.close(); print("Database connection closed.")
+        # Whatever stopped the run (a database error, a failed swap, any other exception), the copy is never reused.
+        if work_path and work_path.exists():
+            work_path.unlink(); print("The working copy was discarded. The original database was not modified.")
+    return songID_correlation, committed, complete
+
+def save_correlations(songID_correlation, metrics, complete=True, path=CORRELATION_FILE):
+    """Saves the matched songs. Only a complete map replaces the index; a partial one is merged into it."""
+    with metrics.phase('correlation-save', len(songID_correlation)), CorrelationStore(path) as correlations:
+        if not complete:
+            correlations.update(songID_correlation)
+            print(f'The library was not read to the end: {len(songID_correlation):,} entries merged into {path}, none removed.')
+            return
+        changed, removed = correlations.sync(songID_correlation)
+    print(f'File correlation index saved to {path} ({changed:,} entries updated, {removed:,} removed).')
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrates ratings, play counts and timestamps from iTunes to Navidrome.')
+    add_metrics_arguments(parser)
+    metrics = Metrics.from_args('itunestoND.py', parser.parse_args())
+    print()
+    print('This script will migrate ratings, play counts, AND timestamps from your ITunes library to your Navidrome database.')
+    _ = input('\nAre you sure you want to continue? (y/n): ').lower()
+    if _ != 'y': print('Good bye.'); sys.exit(0)
+
+    config = get_configuration()
+    library = ITunesLibrary(Path(config['itunes_xml']), library_cache_path(CONFIG_FILE, config))
+
+    with metrics.phase('pre-flight'):
+        it_root_music_path_url, media_index = pre_flight_check(config, library)
+
+    with metrics.phase('checkpoint-load') as phase:
+        previous_states = load_checkpoint(CHECKPOINT_FILE)
+        phase.items = len(previous_states or ())
+    incremental = False
+    if previous_states:
+        print(f'A checkpoint of {len(previous_states):,} songs from a previous run was found in {CHECKPOINT_FILE}.')
+        incremental = input('Only sync songs that changed since then and keep plays recorded by Navidrome? (y/n): ').lower() == 'y'
+
+    songID_correlation, _, complete = sync_tracks(config, library.tracks(), it_root_music_path_url, media_index,
+                                                  previous_states if incremental else None, metrics)
+    save_correlations(songID_correlation, metrics, complete)
+    metrics.finish()
+    print('\nMigration script finished.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+# metrics.py - Per-phase timing and counters shared by the scripts.
+# Each named phase records its wall time, the number of items it handled, the resulting throughput
+# and the peak memory of the process when it ended. API calls are added per endpoint from the
+# Subsonic client. With --metrics-json the numbers are written to a file, so runs can be compared
+# across releases; --profile additionally dumps a cProfile of the whole run.
+
+import cProfile, json, sys, time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+try: import resource
+except ImportError: resource = None  # Not available on Windows; peak memory is then left out.
+
+def peak_rss_mb():
+    """The peak resident memory of this process so far, in MB (None where it can't be measured)."""
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 2**20 if sys.platform == 'darwin' else peak / 2**10, 1)
+
+def add_metrics_arguments(parser):
+    parser.add_argument('--metrics-json', metavar='PATH', help='write per-phase timings and counters to this JSON file')
+    parser.add_argument('--profile', metavar='PATH', help='write a cProfile dump of the run to this file (view it with pstats)')
+
+class Phase:
+    """A named phase. `items` can be set or increased while the phase runs."""
+    __slots__ = ('name', 'seconds', 'items', 'peak_rss_mb')
+
+    def __init__(self, name):
+        self.name, self.seconds, self.items, self.peak_rss_mb = name, 0.0, 0, None
+
+    def as_dict(self):
+        throughput = round(self.items / self.seconds, 1) if self.items and self.seconds else None
+        return {'phase': self.name, 'seconds': round(self.seconds, 4), 'items': self.items,
+                'items_per_second': throughput, 'peak_rss_mb': self.peak_rss_mb}
+
+class Metrics:
+    """Collects the phases of one run, in the order they first started."""
+
+    def __init__(self, script, metrics_json=None, profile=None):
+        self.script, self.metrics_json, self.profile_path = script, metrics_json, profile
+        self.phases, self.api_calls = {}, {}
+        self.started = time.perf_counter()
+        self.profiler = None
+        if profile: self.profiler = cProfile.Profile(); self.profiler.enable()
+
+    @classmethod
+    def from_args(cls, script, args): return cls(script, args.metrics_json, args.profile)
+
+    def get(self, name):
+        if name not in self.phases: self.phases[name] = Phase(name)
+        return self.phases[name]
+
+    @contextmanager
+    def phase(self, name, items=0):
+        """Times the enclosed block. Running the same phase again adds to its totals."""
+        phase = self.get(name)
+        phase.items += items
+        started = time.perf_counter()
+        try: yield phase
+        finally:
+            phase.seconds += time.perf_counter() - started
+            phase.peak_rss_mb = peak_rss_mb()
+
+    def record(self, name, seconds, items=0):
+        """Adds time measured elsewhere to a phase."""
+        phase = self.get(name)
+        phase.seconds += seconds; phase.items += items; phase.peak_rss_mb = peak_rss_mb()
+
+    def timed_iter(self, name, iterable):
+        """Yields from `iterable`, counting the time spent producing each item (e.g. the XML parser) as phase `name`."""
+        phase, iterator = self.get(name), iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try: item = next(iterator)
+            except StopIteration: break
+            finally: phase.seconds += time.perf_counter() - started
+            phase.items += 1
+            yield item
+        phase.peak_rss_mb = peak_rss_mb()
+
+    def record_api(self, client):
+        """Adds the per-endpoint call counts and latencies of a SubsonicClient."""
+        with client.lock: stats = dict(client.stats)
+        for endpoint, (calls, failures, total, slowest) in stats.items():
+            entry = self.api_calls.setdefault(endpoint, {'calls': 0, 'failures': 0, 'seconds': 0.0, 'slowest_seconds': 0.0})
+            entry['calls'] += calls; entry['failures'] += failures; entry['seconds'] += total
+            entry['slowest_seconds'] = max(entry['slowest_seconds'], slowest)
+
+    def report(self):
+        """Printable lines with one row per phase."""
+        lines = [f"  {'phase':<24} {'seconds':>9} {'items':>10} {'items/s':>11} {'peak MB':>9}"]
+        for phase in self.phases.values():
+            row = phase.as_dict()
+            throughput = f"{row['items_per_second']:,.0f}" if row['items_per_second'] else '-'
+            peak = f"{row['peak_rss_mb']:.1f}" if row['peak_rss_mb'] is not None else '-'
+            lines.append(f"  {phase.name:<24} {phase.seconds:9.2f} {phase.items:>10,} {throughput:>11} {peak:>9}")
+        lines.append(f"  {'total':<24} {time.perf_counter() - self.started:9.2f}")
+        return lines
+
+    def finish(self):
+        """Prints the phase table and writes the JSON file and the profile, if they were requested."""
+        if self.profiler:
+            self.profiler.disable(); self.profiler.dump_stats(self.profile_path)
+            print(f"Profile written to {self.profile_path}")
+        print("\n--- PHASE TIMINGS ---")
+        print('\n'.join(self.report()))
+        if self.metrics_json:
+            data = {'script': self.script, 'finished_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                    'total_seconds': round(time.perf_counter() - self.started, 4), 'peak_rss_mb': peak_rss_mb(),
+                    'phases': [phase.as_dict() for phase in self.phases.values()],
+                    'api_calls': {endpoint: {**entry, 'seconds': round(entry['seconds'], 4), 'slowest_seconds': round(entry['slowest_seconds'], 4)}
+                                  for endpoint, entry in sorted(self.api_calls.items())}}
+            with open(self.metrics_json, 'w') as f: json.dump(data, f, indent=4)
+            print(f"Metrics written to {self.metrics_json}")
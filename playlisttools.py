@@ -4,42 +4,124 @@ import os
 import json
 import re
 import getpass # Not used directly in the provided snippet but good to keep
-import requests
-import random
-import string
 import sys
-from hashlib import md5
+import sqlite3
+import time
+import asyncio
+import functools
+import argparse
+import hashlib
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime
+from pathlib import Path
+from subsonicclient import SubsonicClient
+from fuzzymatch import FuzzyMatcher, DEFAULT_THRESHOLD as DEFAULT_FUZZY_THRESHOLD
+from metrics import Metrics, add_metrics_arguments
 
 CONFIG_FILE = "config.json"
+SEARCH_CACHE_FILE = "search_cache.db"
+LIBRARY_INDEX_FILE = "library_index.db"  # Full-text index over a local navidrome.db, rebuilt when the library changes
+INDEX_VERSION = 2  # Bump when the normalized columns of the library index change
+DEFAULT_CACHE_TTL_HOURS = 24 * 7
+DEFAULT_CACHE_MAX_ENTRIES = 200000
+DEFAULT_SEARCH_CONCURRENCY = 8  # search3 requests kept in flight while checking playlists
+EXPORT_DIR = "navidrome_playlists"  # "Download ALL Playlists" keeps this folder in sync with the server
+EXPORT_MANIFEST = "export_manifest.json"
+DEFAULT_EXPORT_CONCURRENCY = 8  # getPlaylist requests kept in flight while exporting
+PLAYLIST_EXTENSIONS = ('.m3u', '.m3u8')
+MIN_FILES_FOR_PROCESS_POOL = 16  # Below this, starting worker processes costs more than it saves
 
 # --- API & CONFIGURATION FUNCTIONS ---
 
+_clients = {}
+_metrics = Metrics('playlisttools.py')  # Replaced in main_menu() by one that honours the command line options
+
+def get_client(base_url, username, password):
+    """Returns the shared, connection-pooled API client for these credentials (created on first use)."""
+    key = (base_url, username, password)
+    if key not in _clients: _clients[key] = SubsonicClient(base_url, username, password, client_name='PlaylistTool', timeout=20)
+    return _clients[key]
+
 def send_api_request(base_url, username, password, endpoint, **kwargs):
-    """Manually constructs and sends a Subsonic API request. Returns response dict on success, None on failure."""
+    """Sends a Subsonic API request through the shared client. Returns response dict on success, None on failure."""
     if not all([base_url, username, password]): return None
-    url = base_url.strip()
-    if not url.endswith('/'): url += '/'
-    if not url.endswith('/rest/'): url += 'rest/'
-    api_args = {'f': 'json', 'u': username, 'v': '1.16.1', 'c': 'PlaylistTool'}
-    query = kwargs.pop('query', None)
-    api_args.update(kwargs)
-    salt = ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(7))
-    token = md5((password + salt).encode('utf-8')).hexdigest()
-    api_args.update({'t': token, 's': salt})
-    full_url = url + endpoint + ".view"
-    params = api_args.copy()
-    if query: params['query'] = query
-    try:
-        res = requests.get(full_url, params=params, timeout=20)
-        res.raise_for_status()
-        res_json = res.json()
-        if 'subsonic-response' in res_json and res_json['subsonic-response'].get('status') == 'ok':
-            return res_json['subsonic-response']
-    except (requests.exceptions.RequestException, json.JSONDecodeError):
-        # print(f"API request to {full_url} failed: {e}") # Uncomment for debugging
-        return None
-    return None
+    if not kwargs.get('query'): kwargs.pop('query', None)
+    return get_client(base_url, username, password).request(endpoint, **kwargs)
+
+class SearchCache:
+    """Persistent cache of search results, keyed by (endpoint, query, songCount).
+       Entries expire after `ttl_hours`, the least recently used ones are evicted beyond `max_entries`,
+       and everything is dropped automatically when the server's last library scan changes."""
+
+    def __init__(self, path, scan_stamp, ttl_hours=DEFAULT_CACHE_TTL_HOURS, max_entries=DEFAULT_CACHE_MAX_ENTRIES):
+        self.conn = sqlite3.connect(path)
+        self.ttl, self.max_entries = ttl_hours * 3600, max_entries
+        self.hits = self.misses = self.pending_writes = 0
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS search_cache (endpoint TEXT, query TEXT, song_count INTEGER, response TEXT, '
+                          'created_at REAL, last_used REAL, PRIMARY KEY (endpoint, query, song_count))')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS search_cache_last_used ON search_cache (last_used)')
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'scan_stamp'").fetchone()
+        if not row or row[0] != scan_stamp:
+            if row: print("The server library was rescanned since the last run, clearing the search cache.")
+            self.conn.execute('DELETE FROM search_cache')
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('scan_stamp', ?)", (scan_stamp,))
+        self.conn.execute('DELETE FROM search_cache WHERE created_at < ?', (time.time() - self.ttl,))
+        self.conn.commit()
+        self.size = self.conn.execute('SELECT COUNT(*) FROM search_cache').fetchone()[0]
+
+    def get(self, endpoint, query, song_count):
+        row = self.conn.execute('SELECT response, created_at FROM search_cache WHERE endpoint = ? AND query = ? AND song_count = ?',
+                                (endpoint, query, song_count)).fetchone()
+        if not row or row[1] < time.time() - self.ttl: self.misses += 1; return None
+        self.hits += 1
+        self.conn.execute('UPDATE search_cache SET last_used = ? WHERE endpoint = ? AND query = ? AND song_count = ?',
+                          (time.time(), endpoint, query, song_count))
+        self._written()
+        return json.loads(row[0])
+
+    def put(self, endpoint, query, song_count, response):
+        now, response = time.time(), json.dumps(response)
+        # Refreshing an expired entry must not count as a new one, so only an actual insert grows the size.
+        cur = self.conn.execute('UPDATE search_cache SET response = ?, created_at = ?, last_used = ? WHERE endpoint = ? AND query = ? AND song_count = ?',
+                                (response, now, now, endpoint, query, song_count))
+        if not cur.rowcount:
+            self.conn.execute('INSERT INTO search_cache VALUES (?, ?, ?, ?, ?, ?)', (endpoint, query, song_count, response, now, now))
+            self.size += 1
+        if self.size > self.max_entries:
+            # Evict the least recently used tenth in one go, so this doesn't run on every insert.
+            evict = self.size - self.max_entries + self.max_entries // 10
+            self.conn.execute('DELETE FROM search_cache WHERE rowid IN (SELECT rowid FROM search_cache ORDER BY last_used LIMIT ?)', (evict,))
+            self.size = self.conn.execute('SELECT COUNT(*) FROM search_cache').fetchone()[0]
+        self._written()
+
+    def _written(self):
+        self.pending_writes += 1
+        if self.pending_writes >= 500: self.flush()
+
+    def flush(self):
+        self.conn.commit(); self.pending_writes = 0
+
+    def close(self):
+        self.flush(); self.conn.close()
+
+_search_cache = None
+
+def open_search_cache(config):
+    """Opens the persistent search cache for this session, unless it is disabled in config.json.
+       The server's library scan status decides whether the cached results are still valid."""
+    global _search_cache
+    if _search_cache: _search_cache.close(); _search_cache = None
+    if not config.get('search_cache', True): return None
+    res = send_api_request(config['navidrome_url'], config['navidrome_user'], config['navidrome_password'], 'getScanStatus')
+    if not res or 'scanStatus' not in res: return None
+    status = res['scanStatus']
+    scan_stamp = f"{status.get('lastScan', '')}|{status.get('count', '')}|{status.get('folderCount', '')}"
+    _search_cache = SearchCache(SEARCH_CACHE_FILE, scan_stamp,
+                                ttl_hours=config.get('search_cache_ttl_hours', DEFAULT_CACHE_TTL_HOURS),
+                                max_entries=config.get('search_cache_max_entries', DEFAULT_CACHE_MAX_ENTRIES))
+    return _search_cache
 
 def verify_connection(config):
     """Verifies credentials by pinging and performing a test search."""
@@ -90,32 +172,75 @@ def handle_config():
 
 # --- HELPER FUNCTIONS ---
 
+# Example path: Artist/Album/01 - Song Title.mp3
+# Group 1: Artist, Group 2: Album, Group 3: Song Title, Group 4: Extension
+TRACK_PATH = re.compile(r"([^/]+)/([^/]+)/(.+)\.(mp3|flac|m4a|ogg|wav)", re.IGNORECASE)
+TRACK_NUMBER = re.compile(r'^\s*\d+\s*[-._]?\s*')  # "01 - Song" -> "Song", "1. Song" -> "Song"
+EXTINF = re.compile(r'#EXTINF:[^,]*,(.*)', re.IGNORECASE)  # "#EXTINF:215,Artist - Title"
+
+def iter_m3u_entries(file_path):
+    """Yields (#EXTINF line or None, path line) for every entry of an M3U or M3U8 file, reading it line by line."""
+    with open(file_path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        extinf = None
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            if line.startswith('#'):
+                if EXTINF.match(line): extinf = line
+                continue
+            yield extinf, line
+            extinf = None
+
+def track_from_entry(extinf, path_line):
+    """The (artist, album, title) of a playlist entry, cleaning the title from the path of its track number. The
+       artist and title of an #EXTINF line take precedence over the path. None if neither gives artist and title."""
+    match = TRACK_PATH.match(path_line)
+    artist, album, title = (match.group(1).strip(), match.group(2).strip(), TRACK_NUMBER.sub('', match.group(3).strip())) if match else (None, '', None)
+    if extinf:
+        info = EXTINF.match(extinf).group(1).strip()
+        extinf_artist, separator, extinf_title = info.partition(' - ')
+        if separator: artist, title = extinf_artist.strip() or artist, extinf_title.strip() or title
+        else: title = info or title
+    return (artist, album, title) if artist and title else None
+
 def parse_m3u(file_path):
-    """Parses an M3U file, cleaning track titles by removing track numbers.
-       Returns a list of dicts: {'artist': ..., 'album': ..., 'title': ...}
+    """Parses an M3U or M3U8 file line by line. Returns (tracks, error): the tracks as compact (artist, album, title)
+       tuples in playlist order, and an error message if the file couldn't be read.
     """
     tracks = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as f: lines = f.readlines()
-    except Exception as e:
-        print(f"Could not read file {file_path}: {e}"); return []
-    for line in lines:
-        line = line.strip()
-        if line and not line.startswith('#'):
-            # Example path: Artist/Album/01 - Song Title.mp3
-            # Group 1: Artist, Group 2: Album, Group 3: Song Title, Group 4: Extension
-            match = re.match(r"([^/]+)/([^/]+)/(.+)\.(mp3|flac|m4a|ogg|wav)", line, re.IGNORECASE)
-            if match:
-                raw_title = match.group(3).strip()
-                # Clean track number (e.g., "01 - Song" -> "Song", "1. Song" -> "Song")
-                cleaned_title = re.sub(r'^\s*\d+\s*[-._]?\s*', '', raw_title)
-                tracks.append({'artist': match.group(1).strip(), 'album': match.group(2).strip(), 'title': cleaned_title})
-    return tracks
+        for extinf, path_line in iter_m3u_entries(file_path):
+            track = track_from_entry(extinf, path_line)
+            if track: tracks.append(track)
+    except OSError as e: return tracks, f"Could not read file {file_path}: {e}"
+    return tracks, None
+
+def find_playlist_files(folder_path):
+    """The M3U and M3U8 files in folder_path and all of its subfolders, as sorted paths relative to it."""
+    found = []
+    for root, dirs, files in os.walk(folder_path):
+        found.extend(os.path.relpath(os.path.join(root, name), folder_path) for name in files if name.lower().endswith(PLAYLIST_EXTENSIONS))
+    return sorted(found)
+
+def parse_playlist_files(folder_path, playlist_files):
+    """Parses the playlist files, in a pool of worker processes when there are many. Yields (file, tracks, error)
+       in the order of playlist_files."""
+    paths = [os.path.join(folder_path, name) for name in playlist_files]
+    if len(paths) < MIN_FILES_FOR_PROCESS_POOL:
+        for name, path in zip(playlist_files, paths): yield (name, *parse_m3u(path))
+        return
+    with ProcessPoolExecutor() as pool:
+        chunksize = max(1, len(paths) // (4 * (os.cpu_count() or 1)))
+        for name, (tracks, error) in zip(playlist_files, pool.map(parse_m3u, paths, chunksize=chunksize)): yield name, tracks, error
+
+NON_ALPHANUMERIC = re.compile(r'[\W_]+')
 
 def normalize_for_comparison(text):
-    """Prepares a string for comparison by making it lowercase and removing non-alphanumeric chars."""
+    """Prepares a string for comparison by making it lowercase and removing non-alphanumeric chars.
+       Letters and digits of every script are kept (in composed form), so '花束を君に' doesn't reduce to ''."""
     if not isinstance(text, str): return "" # Handle non-string inputs
-    return re.sub(r'[^a-z0-9]', '', text.lower())
+    text = text.lower() if text.isascii() else unicodedata.normalize('NFKC', text.casefold())
+    return NON_ALPHANUMERIC.sub('', text)
 
 def sanitize_filename(name):
     """Removes characters that are invalid in Windows filenames."""
@@ -149,13 +274,14 @@ def export_missing_albums(missing_tracks_for_export, maybes_for_export):
         for artist, album in missing_albums: f.write(f"{artist} - {album}\n")
     print(f"✅ Report successfully saved to '{filename}'")
 
-def show_statistics(total_tracks, found_tracks_count, missing_tracks_count, maybes_count):
+def show_statistics(total_tracks, found_tracks_count, missing_tracks_count, maybes_count, unique_tracks=None):
     if total_tracks == 0: print("\nNo tracks were scanned."); return
     success_rate = (found_tracks_count + maybes_count) / total_tracks * 100 if total_tracks > 0 else 0
+    if unique_tracks is None: unique_tracks = total_tracks
     print("\n--- SCAN STATISTICS ---")
-    print(f"  Total Tracks Scanned: {total_tracks}\n  -----------------------\n  Found (Exact Match):  {found_tracks_count}\n  Found (Potential):    {maybes_count}\n  Missing:              {missing_tracks_count}\n  -----------------------\n  Overall Match Rate:   {success_rate:.2f}%\n-------------------------")
+    print(f"  Total Tracks Scanned: {total_tracks}\n  Unique Tracks:        {unique_tracks}\n  -----------------------\n  Found (Exact Match):  {found_tracks_count}\n  Found (Potential):    {maybes_count}\n  Missing:              {missing_tracks_count}\n  -----------------------\n  Overall Match Rate:   {success_rate:.2f}%\n-------------------------")
 
-def run_post_check_menu(total_scanned_tracks_all_playlists, all_found_for_stats, all_missing_for_stats, all_maybes_for_stats):
+def run_post_check_menu(total_scanned_tracks_all_playlists, all_found_for_stats, all_missing_for_stats, all_maybes_for_stats, unique_tracks=None):
     while True:
         print("\n--- Post-Scan Menu ---\n1. Show Statistics\n2. Export missing tracks\n3. Export missing albums\n4. Exit to Main Menu")
         choice = input("> ")
@@ -163,7 +289,8 @@ def run_post_check_menu(total_scanned_tracks_all_playlists, all_found_for_stats,
             show_statistics(total_scanned_tracks_all_playlists, 
                             len(all_found_for_stats), 
                             len(all_missing_for_stats), 
-                            len(all_maybes_for_stats))
+                            len(all_maybes_for_stats),
+                            unique_tracks)
         elif choice == '2': export_missing_tracks(all_missing_for_stats, all_maybes_for_stats)
         elif choice == '3': export_missing_albums(all_missing_for_stats, all_maybes_for_stats)
         elif choice == '4': break
@@ -171,94 +298,366 @@ def run_post_check_menu(total_scanned_tracks_all_playlists, all_found_for_stats,
 
 # --- MODE 1: CHECK PLAYLISTS ---
 
-def run_checker_mode(config, scan_results):
+def artist_matches(m3u_artist, found_artist):
+    """The artist condition shared by all matching passes: the M3U artist is contained in the found artist
+       (e.g. 'Artist' in 'Artist feat. Other') or both are equal after normalization."""
+    normalized = normalize_for_comparison(m3u_artist)
+    return (m3u_artist.lower() in found_artist.lower() or
+            (normalized != '' and normalized == normalize_for_comparison(found_artist)))
+
+def partial_title(title):
+    """The first 1-3 words of a title, used for the 'maybe' pass."""
+    title_words = title.split()
+    return ' '.join(title_words[:min(len(title_words), 3)])
+
+def make_scan_item(track_data, song, status, score=None):
+    item = {'original_track': track_data, 'navidrome_song': song, 'status': status}
+    if status == 'maybe': item['maybe_found_details'] = f"{song['title']} by {song['artist']}"
+    if score is not None: item['maybe_found_details'] += f" ({score:.0%} similar)"
+    return item
+
+def strong_query(track_data): return f"{track_data['artist']} {track_data['title']}"
+def partial_query(track_data): return f"{track_data['artist']} {partial_title(track_data['title'])}"
+
+def pick_strong_match(track_data, res):
+    """PASS 1: returns the song from a search3 response that matches the track, or None."""
+    if res and res.get('searchResult3', {}).get('song'):
+        normalized_m3u_title = normalize_for_comparison(track_data['title'])
+        for found_song in res['searchResult3']['song']:
+            # Strong match condition: artist must be in found artist AND normalized title must match
+            if artist_matches(track_data['artist'], found_song['artist']) and \
+               normalized_m3u_title == normalize_for_comparison(found_song['title']):
+                return found_song
+    return None
+
+def pick_partial_match(track_data, res):
+    """PASS 2: returns a potential match from the response of the partial-title search, or None."""
+    if res and res.get('searchResult3', {}).get('song'):
+        normalized_partial_title = normalize_for_comparison(partial_title(track_data['title']))
+        if not normalized_partial_title: return None  # Every title would start with ''
+        for found_song in res['searchResult3']['song']:
+            # Heuristic for "maybe": original artist likely in found artist and found title starts with partial title
+            if artist_matches(track_data['artist'], found_song['artist']) and \
+               normalize_for_comparison(found_song['title']).startswith(normalized_partial_title):
+                return found_song
+    return None
+
+async def _scan_tracks_async(config, playlist_tracks, concurrency):
     url, user, pwd = config['navidrome_url'], config['navidrome_user'], config['navidrome_password']
+    loop = asyncio.get_running_loop()
+    in_flight = asyncio.Semaphore(concurrency)
+    pass2_count = 0
+
+    async def search(query):
+        # The cache is only touched from the event loop thread; just the HTTP call runs in the executor.
+        if _search_cache:
+            cached = _search_cache.get('search3', query, 5)
+            if cached is not None: return cached
+        async with in_flight:
+            res = await loop.run_in_executor(None, functools.partial(send_api_request, url, user, pwd, 'search3', query=query, songCount=5))
+        if res is not None and _search_cache: _search_cache.put('search3', query, 5, res)
+        return res
+
+    async def scan_track(track_data):
+        nonlocal pass2_count
+        song = pick_strong_match(track_data, await search(strong_query(track_data)))
+        if song: return make_scan_item(track_data, song, 'found')
+        # A miss goes straight to PASS 2, without waiting for the rest of the playlist.
+        pass2_count += 1
+        song = pick_partial_match(track_data, await search(partial_query(track_data)))
+        return make_scan_item(track_data, song, 'maybe' if song else 'missing')
+
+    # gather() returns the results in the order of the tracks, however the requests finish.
+    items = await asyncio.gather(*(scan_track(track_data) for track_data in playlist_tracks))
+    return items, pass2_count
+
+def scan_tracks_via_search(config, playlist_tracks):
+    """Matches tracks with search3 requests, keeping up to 'search_concurrency' requests in flight.
+       Returns the scan items in original order."""
+    concurrency = max(1, int(config.get('search_concurrency', DEFAULT_SEARCH_CONCURRENCY)))
+    print(f"Resolving {len(playlist_tracks)} tracks. PASS 1 (strong matches) and PASS 2 (partial search) with up to {concurrency} parallel requests...")
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        loop = asyncio.new_event_loop()
+        loop.set_default_executor(pool)
+        try: playlist_scan_items, pass2_count = loop.run_until_complete(_scan_tracks_async(config, playlist_tracks, concurrency))
+        finally: loop.close()
+    if pass2_count: print(f"PASS 2: Partial search was needed for {pass2_count} track(s).")
+    return list(playlist_scan_items)
+
+class SongCatalogue:
+    """A local snapshot of every song on the server, indexed for in-memory matching with the same
+       rules as the search3 passes."""
+
+    PAGE_SIZE = 500
+
+    def __init__(self, songs):
+        self.songs = songs
+        self.by_artist_album_title, self.by_artist_title, self.by_artist = {}, {}, {}
+        self.artist_names = {}  # lowercased artist name -> normalized artist key
+        for song in songs:
+            artist, title = normalize_for_comparison(song.get('artist')), normalize_for_comparison(song.get('title'))
+            album = normalize_for_comparison(song.get('album'))
+            if not artist: continue  # An empty key would match every other song without a usable artist
+            if title:
+                self.by_artist_album_title.setdefault((artist, album, title), song)
+                self.by_artist_title.setdefault((artist, title), song)
+            self.by_artist.setdefault(artist, []).append(song)
+            self.artist_names.setdefault((song.get('artist') or '').lower(), artist)
+        self._artist_key_cache = {}
+        self._fuzzy_matcher = None
+
+    def __len__(self): return len(self.songs)
+
+    @classmethod
+    def download(cls, config):
+        """Downloads the full song list, by paging search3 with an empty query or, for servers that don't
+           support that, by walking getArtists/getArtist/getAlbum. Returns None if a request failed, rather than
+           matching against an incomplete catalogue."""
+        client = get_client(config['navidrome_url'], config['navidrome_user'], config['navidrome_password'])
+        songs, offset = [], 0
+        while True:
+            res = client.request('search3', query='', songCount=cls.PAGE_SIZE, songOffset=offset, artistCount=0, albumCount=0)
+            if res is None and offset:
+                print(f"\n  Error: The songs after the first {offset:,} could not be downloaded."); return None
+            page = (res or {}).get('searchResult3', {}).get('song', [])
+            songs.extend(page); offset += len(page)
+            if page: print(f"  {len(songs):,} songs downloaded...", end='\r')
+            if len(page) < cls.PAGE_SIZE: break
+        if not songs:
+            print("  Empty searches are not supported by this server, walking through all artists instead...")
+            songs = cls._walk_artists(client)
+            if songs is None: print("  Error: The song list could not be downloaded completely."); return None
+        print(f"  {len(songs):,} songs downloaded.       ")
+        return cls(songs)
+
+    @staticmethod
+    def _walk_artists(client):
+        """All songs, artist by artist and album by album. None as soon as one request fails."""
+        songs = []
+        res = client.request('getArtists')
+        if res is None: return None
+        artist_ids = [artist['id'] for index in res.get('artists', {}).get('index', []) for artist in index.get('artist', [])]
+        for artist_id in artist_ids:
+            res = client.request('getArtist', id=artist_id)
+            if res is None: return None
+            for album in res.get('artist', {}).get('album', []):
+                res = client.request('getAlbum', id=album['id'])
+                if res is None: return None
+                songs.extend(res.get('album', {}).get('song', []))
+        return songs
+
+    def _artist_keys(self, m3u_artist):
+        """All normalized artist keys that satisfy artist_matches() for this M3U artist (cached)."""
+        if m3u_artist not in self._artist_key_cache:
+            lowered, normalized = m3u_artist.lower(), normalize_for_comparison(m3u_artist)
+            keys = {normalized} if normalized in self.by_artist else set()
+            keys.update(key for name, key in self.artist_names.items() if lowered in name)
+            keys.discard('')
+            self._artist_key_cache[m3u_artist] = keys
+        return self._artist_key_cache[m3u_artist]
+
+    def strong_match(self, track_data):
+        artist, title = normalize_for_comparison(track_data['artist']), normalize_for_comparison(track_data['title'])
+        if not title: return None  # Nothing left to compare; the partial and fuzzy passes still get a try
+        song = self.by_artist_album_title.get((artist, normalize_for_comparison(track_data['album']), title))
+        if song and artist_matches(track_data['artist'], song.get('artist') or ''): return song
+        for artist_key in self._artist_keys(track_data['artist']):
+            song = self.by_artist_title.get((artist_key, title))
+            if song: return song
+        return None
+
+    def partial_match(self, track_data):
+        normalized_partial_title = normalize_for_comparison(partial_title(track_data['title']))
+        if not normalized_partial_title: return None
+        for artist_key in self._artist_keys(track_data['artist']):
+            for song in self.by_artist[artist_key]:
+                if normalize_for_comparison(song['title']).startswith(normalized_partial_title): return song
+        return None
+
+    def fuzzy_matcher(self, threshold):
+        """The trigram index over the catalogue, built the first time it is needed."""
+        if self._fuzzy_matcher is None: self._fuzzy_matcher = FuzzyMatcher(self.songs, threshold)
+        self._fuzzy_matcher.threshold = threshold
+        return self._fuzzy_matcher
+
+def scan_tracks_via_catalogue(catalogue, playlist_tracks, fuzzy_threshold=DEFAULT_FUZZY_THRESHOLD):
+    """Matches tracks against the downloaded catalogue, without any server requests. Tracks that neither
+       match exactly nor by partial title are scored together by the fuzzy matcher."""
+    print(f"Resolving {len(playlist_tracks)} tracks against the local catalogue...")
+    playlist_scan_items, unresolved = [], []
+    for position, track_data in enumerate(playlist_tracks):
+        song = catalogue.strong_match(track_data)
+        if song: playlist_scan_items.append(make_scan_item(track_data, song, 'found')); continue
+        song = catalogue.partial_match(track_data)
+        playlist_scan_items.append(make_scan_item(track_data, song, 'maybe' if song else 'missing'))
+        if not song: unresolved.append(position)
+    if unresolved:
+        print(f"Fuzzy matching {len(unresolved)} remaining track(s) (similarity of at least {fuzzy_threshold:.0%})...")
+        with _metrics.phase('fuzzy-match', len(unresolved)):
+            matcher = catalogue.fuzzy_matcher(fuzzy_threshold)
+            for position, match in zip(unresolved, matcher.best_matches([playlist_tracks[position] for position in unresolved])):
+                if match: playlist_scan_items[position] = make_scan_item(playlist_tracks[position], match[1], 'maybe', match[0])
+    return playlist_scan_items
+
+class LibraryDatabase:
+    """Matches tracks with SQL against a local copy of navidrome.db, without any server requests.
+       navidrome.db is only ever opened read-only; its songs are copied into a separate index database
+       with normalized match keys and an FTS5 index over artist, album, title and path. The index is
+       reused as long as media_file is unchanged."""
+
+    SONG_COLUMNS = ('id', 'title', 'artist', 'album', 'path', 'duration')
+
+    def __init__(self, navidrome_db, index_path=LIBRARY_INDEX_FILE):
+        source = sqlite3.connect(Path(navidrome_db).resolve().as_uri() + '?mode=ro', uri=True)
+        try:
+            count, last_update = source.execute('SELECT COUNT(*), MAX(updated_at) FROM media_file').fetchone()
+            stamp = f"{INDEX_VERSION}|{Path(navidrome_db).resolve()}|{count}|{last_update}"
+            self.conn = sqlite3.connect(index_path)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'library_stamp'").fetchone()
+            if not row or row[0] != stamp: self._rebuild(source, stamp, count)
+            else: print(f"  Reusing the library index in '{index_path}'.")
+        finally: source.close()
+        self.size = self.conn.execute('SELECT COUNT(*) FROM song').fetchone()[0]
+
+    def __len__(self): return self.size
+
+    def close(self): self.conn.close()
+
+    def _rebuild(self, source, stamp, count):
+        print(f"  Indexing {count:,} songs from navidrome.db...")
+        with self.conn:
+            self.conn.execute('DROP TABLE IF EXISTS song_fts')
+            self.conn.execute('DROP TABLE IF EXISTS song')
+            self.conn.execute('CREATE TABLE song (id TEXT, title TEXT, artist TEXT, album TEXT, path TEXT, duration REAL, '
+                              'artist_lower TEXT, norm_artist TEXT, norm_album TEXT, norm_title TEXT)')
+            rows = source.execute('SELECT id, title, artist, album, path, duration FROM media_file')
+            self.conn.executemany('INSERT INTO song VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                  (row + ((row[2] or '').lower(), normalize_for_comparison(row[2]),
+                                          normalize_for_comparison(row[3]), normalize_for_comparison(row[1])) for row in rows))
+            self.conn.execute('CREATE INDEX song_norm_title ON song (norm_title)')
+            self.conn.execute("CREATE VIRTUAL TABLE song_fts USING fts5(artist, album, title, path, content='song', "
+                              "content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')")
+            self.conn.execute("INSERT INTO song_fts (song_fts) VALUES ('rebuild')")
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('library_stamp', ?)", (stamp,))
+
+    def _songs(self, sql, params):
+        return [dict(zip(self.SONG_COLUMNS, row)) for row in self.conn.execute(sql, params)]
+
+    def strong_match(self, track_data):
+        """Same rule as PASS 1: matching artist and equal normalized title, preferring the same album."""
+        album, title = normalize_for_comparison(track_data['album']), normalize_for_comparison(track_data['title'])
+        if not title: return None  # '' would equal every other title without letters or digits
+        candidates = self.conn.execute('SELECT id, title, artist, album, path, duration, norm_album FROM song WHERE norm_title = ?',
+                                       (title,)).fetchall()
+        candidates.sort(key=lambda row: row[6] != album)
+        for row in candidates:
+            if artist_matches(track_data['artist'], row[2] or ''): return dict(zip(self.SONG_COLUMNS, row))
+        return None
+
+    @staticmethod
+    def _fts_terms(text):
+        """Every word as an FTS5 string (embedded quotes doubled), so nothing in a title is read as query syntax."""
+        return ' '.join('"' + word.replace('"', '""') + '"' for word in re.findall(r'\w+', text))
+
+    def partial_match(self, track_data):
+        """Same rule as PASS 2. The full-text index narrows the songs down to those sharing the artist's
+           words and the first words of the title."""
+        artist_terms, title_terms = self._fts_terms(track_data['artist']), self._fts_terms(partial_title(track_data['title']))
+        if not title_terms: return None
+        query = f'title : ({title_terms})' + (f' AND artist : ({artist_terms})' if artist_terms else '')
+        candidates = self._songs('SELECT song.id, song.title, song.artist, song.album, song.path, song.duration FROM song_fts '
+                                 'JOIN song ON song.rowid = song_fts.rowid WHERE song_fts MATCH ? ORDER BY rank LIMIT 50', (query,))
+        return pick_partial_match(track_data, {'searchResult3': {'song': candidates}})
+
+def open_library_database(config):
+    """Asks for the navidrome.db to read (defaulting to 'navidrome_db' in config.json) and opens its index."""
+    default_path = config.get('navidrome_db', '')
+    db_path = input(f"Enter path to navidrome.db [{default_path}]: ").strip().strip('"') or default_path
+    if not os.path.isfile(db_path): print("Error: navidrome.db not found."); return None
+    try: return LibraryDatabase(db_path)
+    except sqlite3.Error as e: print(f"Error: Could not read navidrome.db ({e})."); return None
+
+def scan_tracks_via_database(library_db, playlist_tracks):
+    """Matches tracks against the local library index, without any server requests."""
+    print(f"Resolving {len(playlist_tracks)} tracks against navidrome.db...")
+    playlist_scan_items = []
+    for track_data in playlist_tracks:
+        song = library_db.strong_match(track_data)
+        if song: playlist_scan_items.append(make_scan_item(track_data, song, 'found')); continue
+        song = library_db.partial_match(track_data)
+        playlist_scan_items.append(make_scan_item(track_data, song, 'maybe' if song else 'missing'))
+    return playlist_scan_items
+
+def track_key(track_data):
+    """Identifies an M3U entry across playlists, so it is resolved only once. Only case is ignored: every matcher
+       lowercases artist, album and title, but the artist is also matched as a substring, where spacing counts."""
+    return tuple(track_data[field].lower() for field in ('artist', 'album', 'title'))
+
+def run_checker_mode(config, scan_results):
     folder_path = input("\nEnter path to FOLDER with local M3U playlists: ").strip()
     if not os.path.isdir(folder_path): print(f"Error: Not a valid folder."); return
-    m3u_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.m3u')]
-    if not m3u_files: print(f"No '.m3u' files found in folder."); return
+    m3u_files = find_playlist_files(folder_path)
+    if not m3u_files: print(f"No '.m3u' or '.m3u8' files found in folder or its subfolders."); return
     
-    print(f"\nFound {len(m3u_files)} playlists: {', '.join(m3u_files)}")
+    print(f"\nFound {len(m3u_files)} playlists" + (f": {', '.join(m3u_files)}" if len(m3u_files) <= 20 else "."))
+    print("\nHow should tracks be matched?\n1. Search the server for every track\n2. Download the whole server catalogue once and match locally (faster for many playlists)"
+          "\n3. Read a local copy of navidrome.db directly (no server requests)")
+    catalogue = library_db = None
+    method = input("> ").strip()
+    if method == '2':
+        print("\nDownloading the song catalogue from the server...")
+        with _metrics.phase('catalogue-download') as phase:
+            catalogue = SongCatalogue.download(config)
+            phase.items = len(catalogue or ())
+        if catalogue is None: print("Nothing was checked."); return
+        if not len(catalogue): print("Could not download any songs from the server, so nothing was checked."); return
+    elif method == '3':
+        with _metrics.phase('library-index') as phase:
+            library_db = open_library_database(config)
+            phase.items = len(library_db or ())
+        if library_db is None: return
+        if not len(library_db): print("navidrome.db contains no songs, so nothing was checked."); library_db.close(); return
+    elif open_search_cache(config):
+        print(f"Using the search cache in '{SEARCH_CACHE_FILE}' ({_search_cache.size:,} cached results).")
     scan_results.clear() # Clear previous scan results
     
-    total_scanned_tracks_all_playlists = 0
+    # Read every playlist first, so a track that appears in many playlists is only resolved once.
+    # Every distinct track becomes one dict, shared by all the playlists it appears in.
+    playlists, unique_tracks, track_dicts = {}, {}, {}
+    with _metrics.phase('parse-m3u') as phase:
+        for filename, tracks, error in parse_playlist_files(folder_path, m3u_files):
+            if error: print(error)
+            if not tracks: print(f"{filename}: No valid tracks found. Skipping."); continue
+            playlist_tracks_original_order = []
+            for track in tracks:
+                track_data = track_dicts.get(track)
+                if track_data is None:
+                    track_data = track_dicts[track] = {'artist': track[0], 'album': track[1], 'title': track[2]}
+                    unique_tracks.setdefault(track_key(track_data), track_data)
+                playlist_tracks_original_order.append(track_data)
+            playlists[filename] = playlist_tracks_original_order
+            phase.items += len(tracks)
+
+    total_scanned_tracks_all_playlists = sum(len(tracks) for tracks in playlists.values())
+    print(f"\n{total_scanned_tracks_all_playlists} tracks in {len(playlists)} playlists, {len(unique_tracks)} of them unique.")
+    with _metrics.phase('resolve', len(unique_tracks)):
+        if catalogue is not None: resolved_items = scan_tracks_via_catalogue(catalogue, list(unique_tracks.values()), float(config.get('fuzzy_threshold', DEFAULT_FUZZY_THRESHOLD)))
+        elif library_db is not None:
+            resolved_items = scan_tracks_via_database(library_db, list(unique_tracks.values()))
+            library_db.close()
+        else: resolved_items = scan_tracks_via_search(config, list(unique_tracks.values()))
+    resolved = dict(zip(unique_tracks, resolved_items))
+
     all_found_for_stats = [] # For statistics and exports
     all_missing_for_stats = []
     all_maybes_for_stats = []
 
-    for filename in m3u_files:
-        print(f"\n\n--- Checking Playlist: {filename} ---")
-        playlist_tracks_original_order = parse_m3u(os.path.join(folder_path, filename))
-        
-        if not playlist_tracks_original_order: print("No valid tracks found. Skipping."); continue
-        
-        total_scanned_tracks_all_playlists += len(playlist_tracks_original_order)
-        
-        # New structure: a list of track items, preserving original order
-        # Each item will be updated with its scan status and Navidrome match
+    for filename, playlist_tracks_original_order in playlists.items():
+        # A list of track items in original order, each with its scan status and Navidrome match
         playlist_scan_items = []
-        
-        print(f"Found {len(playlist_tracks_original_order)} tracks. PASS 1: Strong matches...")
-        
-        # Pass 1: Initial search and populate playlist_scan_items
-        for i, track_data in enumerate(playlist_tracks_original_order):
-            simple_query = f"{track_data['artist']} {track_data['title']}"
-            res = send_api_request(url, user, pwd, 'search3', query=simple_query, songCount=5)
-            
-            found_match_navidrome_song = None
-            if res and res.get('searchResult3', {}).get('song'):
-                normalized_m3u_title = normalize_for_comparison(track_data['title'])
-                for found_song in res['searchResult3']['song']:
-                    # Strong match condition: artist must be in found artist AND normalized title must match
-                    if (track_data['artist'].lower() in found_song['artist'].lower() or
-                        normalize_for_comparison(track_data['artist']) == normalize_for_comparison(found_song['artist'])) and \
-                       normalized_m3u_title == normalize_for_comparison(found_song['title']):
-                        found_match_navidrome_song = found_song
-                        break
-            
-            if found_match_navidrome_song:
-                playlist_scan_items.append({
-                    'original_track': track_data,
-                    'navidrome_song': found_match_navidrome_song,
-                    'status': 'found'
-                })
-            else:
-                # Add a placeholder for tracks not found in pass 1, to be processed in pass 2
-                playlist_scan_items.append({
-                    'original_track': track_data,
-                    'navidrome_song': None, # No direct match yet
-                    'status': 'unprocessed_pass2'
-                })
-        
-        # Pass 2: Partial search for 'unprocessed_pass2' tracks
-        tracks_for_pass2_count = sum(1 for item in playlist_scan_items if item['status'] == 'unprocessed_pass2')
-        if tracks_for_pass2_count > 0:
-            print(f"\nPASS 2: Partial search for {tracks_for_pass2_count} track(s)...")
-            for item in playlist_scan_items:
-                if item['status'] == 'unprocessed_pass2':
-                    original_track = item['original_track']
-                    # Try a partial title search
-                    title_words = original_track['title'].split()
-                    partial_title = ' '.join(title_words[:min(len(title_words), 3)]) # Use 1-3 words
-                    
-                    simple_partial_query = f"{original_track['artist']} {partial_title}"
-                    res = send_api_request(url, user, pwd, 'search3', query=simple_partial_query, songCount=5)
-                    
-                    found_maybe = False
-                    if res and res.get('searchResult3', {}).get('song'):
-                        normalized_partial_title = normalize_for_comparison(partial_title)
-                        for found_song in res['searchResult3']['song']:
-                            # Heuristic for "maybe": original artist likely in found artist and found title starts with partial title
-                            if (original_track['artist'].lower() in found_song['artist'].lower() or
-                                normalize_for_comparison(original_track['artist']) == normalize_for_comparison(found_song['artist'])) and \
-                               normalize_for_comparison(found_song['title']).startswith(normalized_partial_title):
-                                item['status'] = 'maybe'
-                                item['navidrome_song'] = found_song # Store the found song for potential future use
-                                item['maybe_found_details'] = f"{found_song['title']} by {found_song['artist']}"
-                                found_maybe = True
-                                break
-                    if not found_maybe:
-                        item['status'] = 'missing'
+        for track_data in playlist_tracks_original_order:
+            playlist_scan_items.append(dict(resolved[track_key(track_data)], original_track=track_data))
         
         # Store the complete scan results for this playlist
         scan_results[filename] = playlist_scan_items
@@ -274,12 +673,18 @@ def run_checker_mode(config, scan_results):
                 track_for_export = item['original_track'].copy()
                 track_for_export['maybe_found'] = item['maybe_found_details']
                 all_maybes_for_stats.append(track_for_export)
+        counts = {status: sum(1 for item in playlist_scan_items if item['status'] == status) for status in ('found', 'maybe', 'missing')}
+        print(f"  {filename}: {counts['found']} found, {counts['maybe']} maybe, {counts['missing']} missing")
 
     print("\n\n--- ALL PLAYLISTS CHECKED ---")
+    if _search_cache and catalogue is None and library_db is None:
+        print(f"Search cache: {_search_cache.hits:,} results reused, {_search_cache.misses:,} requests sent to the server.")
+        _search_cache.flush()
     run_post_check_menu(total_scanned_tracks_all_playlists, 
                         all_found_for_stats, 
                         all_missing_for_stats, 
-                        all_maybes_for_stats)
+                        all_maybes_for_stats,
+                        len(unique_tracks))
 
 # --- MODE 2: FIX PLAYLISTS ---
 
@@ -294,7 +699,7 @@ def create_fixed_playlist(playlist_scan_items, original_filename, output_dir):
     base_name = os.path.splitext(original_filename)[0]
     new_filename = f"{base_name}_fixed.m3u"
     output_path = os.path.join(output_dir, new_filename)
-    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)  # Playlists from subfolders keep their subfolder
     
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write("#EXTM3U\n")
@@ -338,19 +743,66 @@ def run_fixer_mode(scan_results):
 
 # --- MODE 3: MANAGE SERVER PLAYLISTS ---
 
-def download_playlist(config, playlist_id, playlist_name, output_dir):
-    print(f"  Downloading '{playlist_name}'...")
+def write_playlist_file(config, playlist_id, filepath):
+    """Fetches a playlist and writes it as an M3U file. The file is written under a temporary name and renamed
+       when complete, so an interrupted export never leaves a truncated playlist behind. Returns the number of
+       tracks written, or None if the playlist could not be fetched."""
     res = send_api_request(config['navidrome_url'], config['navidrome_user'], config['navidrome_password'], 'getPlaylist', id=playlist_id)
-    if not res or 'playlist' not in res or 'entry' not in res['playlist']:
-        print(f"    ERROR: Could not retrieve tracks for '{playlist_name}'."); return False
-    safe_filename = sanitize_filename(playlist_name) + ".m3u"
-    filepath = os.path.join(output_dir, safe_filename)
-    with open(filepath, 'w', encoding='utf-8') as f:
+    if not res or 'playlist' not in res: return None
+    entries = res['playlist'].get('entry', [])  # Empty playlists come without 'entry'
+    with open(filepath + '.part', 'w', encoding='utf-8') as f:
         f.write("#EXTM3U\n")
         # Tracks from getPlaylist are already in the order they are on the server
-        for track in res['playlist']['entry']: f.write(track['path'] + "\n")
+        f.writelines(track['path'] + "\n" for track in entries)
+    os.replace(filepath + '.part', filepath)
+    return len(entries)
+
+def download_playlist(config, playlist_id, playlist_name, output_dir):
+    print(f"  Downloading '{playlist_name}'...")
+    filepath = os.path.join(output_dir, sanitize_filename(playlist_name) + ".m3u")
+    if write_playlist_file(config, playlist_id, filepath) is None:
+        print(f"    ERROR: Could not retrieve tracks for '{playlist_name}'."); return False
     print(f"    ✅ Saved to '{filepath}'"); return True
 
+def export_all_playlists(config, playlists, output_dir):
+    """Mirrors the server playlists into output_dir as M3U files, fetching several at a time. A manifest records the
+       'changed' stamp and song count of every exported playlist; playlists that still match it are not downloaded
+       again, and files of playlists that were deleted or renamed on the server are removed. Returns the number of
+       playlists that failed."""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, EXPORT_MANIFEST)
+    previous = {}
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f: previous = json.load(f)
+        except (json.JSONDecodeError, OSError): print(f"Could not read '{manifest_path}', exporting everything again.")
+
+    manifest, jobs, used_files = {}, [], set()
+    for p in playlists:
+        filename = sanitize_filename(p['name']) + ".m3u"
+        if filename in used_files: filename = f"{sanitize_filename(p['name'])} ({sanitize_filename(p['id'])}).m3u"  # Two playlists with the same name
+        used_files.add(filename)
+        entry = {'name': p['name'], 'file': filename, 'changed': p.get('changed'), 'songCount': p.get('songCount')}
+        if entry['changed'] and previous.get(p['id']) == entry and os.path.exists(os.path.join(output_dir, filename)): manifest[p['id']] = entry
+        else: jobs.append((p, entry))
+    for old in previous.values():
+        if old.get('file') not in used_files and os.path.exists(os.path.join(output_dir, old.get('file', ''))):
+            os.remove(os.path.join(output_dir, old['file'])); print(f"  Removed '{old['file']}' (no longer on the server).")
+
+    print(f"\n{len(jobs)} of {len(playlists)} playlists changed since the last export to '{output_dir}'.")
+    concurrency = max(1, int(config.get('export_concurrency', DEFAULT_EXPORT_CONCURRENCY)))
+    failed = 0
+    with _metrics.phase('download-playlists', len(jobs)), ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(write_playlist_file, config, p['id'], os.path.join(output_dir, entry['file'])) for p, entry in jobs]
+        for (p, entry), future in zip(jobs, futures):
+            track_count = future.result()
+            if track_count is None: print(f"  ERROR: Could not retrieve tracks for '{p['name']}'."); failed += 1; continue
+            manifest[p['id']] = entry  # Failed playlists stay out of the manifest, so the next export retries them
+            print(f"  ✅ Saved '{p['name']}' ({track_count} tracks) to '{entry['file']}'")
+    with open(manifest_path + '.part', 'w', encoding='utf-8') as f: json.dump(manifest, f, indent=4)
+    os.replace(manifest_path + '.part', manifest_path)
+    return failed
+
 def run_manager_mode(config):
     print("\nFetching playlists from Navidrome server...")
     res = send_api_request(config['navidrome_url'], config['navidrome_user'], config['navidrome_password'], 'getPlaylists')
@@ -379,17 +831,90 @@ def run_manager_mode(config):
             except ValueError: print("Invalid input.")
         elif choice == '3':
             if not playlists: print("No playlists found to download."); continue
-            output_dir = "navidrome_playlists_" + datetime.now().strftime('%Y-%m-%d_%H%M%S')
-            os.makedirs(output_dir, exist_ok=True)
-            print(f"\nDownloading all {len(playlists)} playlists to '{output_dir}'...")
-            for i, p in enumerate(playlists): download_playlist(config, p['id'], p['name'], output_dir)
-            print("\nAll playlists downloaded.")
+            failed = export_all_playlists(config, playlists, config.get('playlist_export_dir', EXPORT_DIR))
+            print("\nAll playlists downloaded." if not failed else f"\n{failed} playlists could not be downloaded.")
         elif choice == '4': break
         else: print("Invalid choice.")
 
+# --- MODE 4: MERGE LOCAL PLAYLISTS ---
+
+MERGE_OPERATIONS = {'1': 'union', '2': 'intersection', '3': 'difference'}
+
+def entry_keys(extinf, path_line, by_title):
+    """The keys a playlist entry is recognised by: its normalized path and, with by_title, its normalized artist
+       and title. Keys are 16-byte digests, so the sets holding them stay small however long the paths are."""
+    path = path_line.replace('\\', '/').casefold()
+    if not path.isascii(): path = unicodedata.normalize('NFC', path)
+    keys = [hashlib.blake2b(b'p' + path.encode('utf-8'), digest_size=16).digest()]
+    track = track_from_entry(extinf, path_line) if by_title else None
+    if track:
+        artist, title = normalize_for_comparison(track[0]), normalize_for_comparison(track[2])
+        if artist and title: keys.append(hashlib.blake2b(f't{artist}\0{title}'.encode('utf-8'), digest_size=16).digest())
+    return keys
+
+def merge_playlists(paths, output_path, operation, dedupe, by_title):
+    """Combines the playlists into output_path, streaming their entries in order (with their #EXTINF lines).
+       union: the entries of all playlists, one after the other.
+       intersection: the entries of the first playlist that are also in every other one.
+       difference: the entries of the first playlist that are in none of the others.
+       With dedupe, only the first occurrence of a track is kept. Only the keys of the entries are held in memory.
+       Returns (entries read, entries written)."""
+    others = []
+    if operation != 'union':
+        for path in paths[1:]:
+            keys = set()
+            for extinf, path_line in iter_m3u_entries(path): keys.update(entry_keys(extinf, path_line, by_title))
+            others.append(keys)
+    seen, read, written = set(), 0, 0
+    with open(output_path + '.part', 'w', encoding='utf-8') as out:
+        out.write("#EXTM3U\n")
+        for path in (paths if operation == 'union' else paths[:1]):
+            for extinf, path_line in iter_m3u_entries(path):
+                read += 1
+                keys = entry_keys(extinf, path_line, by_title) if dedupe or others else ()
+                if operation == 'intersection' and not all(any(key in other for key in keys) for other in others): continue
+                if operation == 'difference' and any(key in other for other in others for key in keys): continue
+                if dedupe:
+                    if any(key in seen for key in keys): continue
+                    seen.update(keys)
+                if extinf: out.write(extinf + "\n")
+                out.write(path_line + "\n"); written += 1
+    os.replace(output_path + '.part', output_path)
+    return read, written
+
+def run_merge_mode():
+    print("\n--- Merge Local M3U Playlists ---")
+    print("Enter the paths of the playlists to merge, one per line. Press Enter on an empty line when done.")
+    paths = []
+    while True:
+        path = input(f"Playlist {len(paths) + 1}: ").strip().strip('"')
+        if not path: break
+        if os.path.isfile(path): paths.append(path)
+        else: print("File not found.")
+    if len(paths) < 2: print("At least two playlists are needed."); return
+
+    print("\nHow should they be combined?\n1. Union: all tracks, in the order the playlists were entered"
+          "\n2. Intersection: the tracks of the first playlist that are in all the others"
+          "\n3. Difference: the tracks of the first playlist that are in none of the others")
+    operation = MERGE_OPERATIONS.get(input("> ").strip())
+    if not operation: print("Invalid choice."); return
+    dedupe = input("Remove duplicate tracks, keeping the first occurrence? (y/n): ").lower() == 'y'
+    by_title = False
+    if dedupe or operation != 'union':
+        by_title = input("Also treat tracks with the same artist and title as the same track, even if their paths differ? (y/n): ").lower() == 'y'
+    output_path = input("Enter filename for the merged playlist [merged_playlist.m3u]: ").strip() or "merged_playlist.m3u"
+
+    with _metrics.phase('merge-playlists') as phase:
+        try: read, written = merge_playlists(paths, output_path, operation, dedupe, by_title)
+        except OSError as e: print(f"Could not merge the playlists: {e}"); return
+        phase.items = read
+    print(f"✅ Merged playlist saved to '{output_path}' ({written:,} of {read:,} tracks).")
+
 # --- MAIN MENU ---
 
-def main_menu():
+def main_menu(args=None):
+    global _metrics
+    if args: _metrics = Metrics.from_args('playlisttools.py', args)
     print("--- Navidrome Playlist Tool ---")
     config = handle_config()
     scan_results = {} # This dictionary will hold the results of the last scan for each playlist
@@ -398,7 +923,8 @@ def main_menu():
         print("1. Check Local M3U Playlists Against Navidrome")
         print("2. Fix Local M3U Playlists (requires a recent check)")
         print("3. Manage/Download Playlists from Navidrome")
-        print("4. Exit")
+        print("4. Merge Local M3U Playlists")
+        print("5. Exit")
         choice = input("> ")
         
         if choice == '1':
@@ -408,9 +934,18 @@ def main_menu():
         elif choice == '3':
             run_manager_mode(config)
         elif choice == '4':
+            run_merge_mode()
+        elif choice == '5':
+            for client in _clients.values():
+                if client.stats: print("\n--- API CALLS ---"); print('\n'.join(client.latency_report()))
+                _metrics.record_api(client)
+            if _search_cache: _search_cache.close()
+            _metrics.finish()
             print("Goodbye!"); break
         else:
             print("Invalid choice.")
 
 if __name__ == "__main__":
-    main_menu()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Checks, fixes and downloads playlists against a Navidrome server.')
+    add_metrics_arguments(parser)
+    main_menu(parser.parse_args())
\ No newline at end of file
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+# subsonicclient.py - Shared Subsonic/Navidrome API client used by itunesPlaylistMigrator.py and playlisttools.py.
+# Keeps one pooled HTTP session (keep-alive), so thousands of calls don't each pay for a new TCP/TLS
+# connection. Transient failures (connection errors, timeouts, 429 and 5xx replies) of reads are retried with
+# exponential backoff, requests can optionally be rate limited, and per-endpoint latencies are recorded.
+# Writes are only retried when they can't have reached the server, so a lost reply never applies them twice.
+
+import json, random, string, threading, time
+from hashlib import md5
+import requests
+from requests.adapters import HTTPAdapter
+
+API_VERSION = '1.16.1'
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Endpoints that change something on the server. They are not retried by default: a timeout may come after
+# the server applied the call, and sending it again would e.g. create a second playlist or add tracks twice.
+WRITE_ENDPOINTS = frozenset(('createPlaylist', 'updatePlaylist', 'deletePlaylist', 'scrobble', 'star', 'unstar',
+                             'setRating', 'createShare', 'updateShare', 'deleteShare', 'startScan'))
+
+def normalize_server_url(url):
+    """Turns '192.168.1.10:4533' or 'http://host/' into 'http://host/rest/'."""
+    url = url.strip()
+    if not url.startswith('http'): url = 'http://' + url
+    if not url.endswith('/'): url += '/'
+    if not url.endswith('/rest/'): url += 'rest/'
+    return url
+
+class SubsonicClient:
+    """Thread-safe Subsonic API client. request() returns the 'subsonic-response' dict on success, None on failure."""
+
+    def __init__(self, server_url, username, password, client_name='python', timeout=30, retries=3,
+                 backoff=0.5, max_requests_per_second=None, pool_size=16, log=None):
+        self.base_url = normalize_server_url(server_url)
+        self.username, self.client_name = username, client_name
+        self.timeout, self.retries, self.backoff = timeout, retries, backoff
+        self.log = log  # Default error reporter (e.g. print); None keeps failures silent.
+        # The salted token only depends on the password, so it is computed once instead of per request.
+        self.salt = ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(7))
+        self.token = md5((password + self.salt).encode('utf-8')).hexdigest()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter); self.session.mount('https://', adapter)
+
+        self.min_interval = 1.0 / max_requests_per_second if max_requests_per_second else 0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+        self.stats = {}  # endpoint -> [calls, failures, total seconds, slowest call]
+
+    @classmethod
+    def from_config(cls, config, url_key, user_key, password_key, **kwargs):
+        """Builds a client from config.json, honouring the optional tuning keys shared by all scripts."""
+        settings = {'timeout': config.get('request_timeout', 30), 'retries': config.get('request_retries', 3),
+                    'max_requests_per_second': config.get('max_requests_per_second')}
+        settings.update(kwargs)
+        return cls(config[url_key], config[user_key], config[password_key], **settings)
+
+    def close(self): self.session.close()
+
+    def _wait_for_slot(self):
+        if not self.min_interval: return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.min_interval
+        if wait > 0: time.sleep(wait)
+
+    def _record(self, endpoint, seconds, ok):
+        with self.lock:
+            entry = self.stats.setdefault(endpoint, [0, 0, 0.0, 0.0])
+            entry[0] += 1; entry[2] += seconds; entry[3] = max(entry[3], seconds)
+            if not ok: entry[1] += 1
+
+    def request(self, endpoint, log=None, post=False, retry=None, **params):
+        """Sends an API request (as a form POST if `post` is set). Parameters that are None are left out.
+           With retry=False, the request is only sent again if it can't have reached the server (connect timeout,
+           429); the default is True for reads and False for the WRITE_ENDPOINTS.
+           Errors are reported through `log`, or the client's default reporter."""
+        log = log or self.log or (lambda *args: None)
+        if retry is None: retry = endpoint not in WRITE_ENDPOINTS
+        api_args = {'f': 'json', 'u': self.username, 'v': API_VERSION, 'c': self.client_name, 't': self.token, 's': self.salt}
+        api_args.update({key: value for key, value in params.items() if value is not None})
+        url = self.base_url + endpoint + '.view'
+
+        res, started = None, time.perf_counter()
+        for attempt in range(self.retries + 1):
+            if attempt: time.sleep(self.backoff * 2 ** (attempt - 1))
+            self._wait_for_slot()
+            try:
+                if post: res = self.session.post(url, data=api_args, timeout=self.timeout)
+                else: res = self.session.get(url, params=api_args, timeout=self.timeout)
+                if res.status_code in RETRY_STATUS_CODES and attempt < self.retries and (retry or res.status_code == 429): continue
+                res.raise_for_status()
+                break
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt < self.retries and (retry or isinstance(e, requests.exceptions.ConnectTimeout)): continue
+                error = e
+            except requests.exceptions.RequestException as e:
+                error = e
+            self._record(endpoint, time.perf_counter() - started, False)
+            log(f"\nCould not reach Navidrome Server at {self.base_url.partition('rest/')[0]}")
+            log(f"Error: {error}"); return None
+
+        try:
+            res_json = res.json()
+        except json.JSONDecodeError:
+            self._record(endpoint, time.perf_counter() - started, False)
+            log("\nAPI Error: Could not decode the server's response."); return None
+
+        subsonic_res = res_json.get('subsonic-response') if isinstance(res_json, dict) else None
+        ok = bool(subsonic_res) and subsonic_res.get('status') == 'ok'
+        self._record(endpoint, time.perf_counter() - started, ok)
+        if ok: return subsonic_res
+        if subsonic_res is None: log("\nAPI Error: The server's response was not in the expected format.")
+        elif 'error' in subsonic_res: log(f"\nAPI Error: {subsonic_res['error'].get('message')} (Code: {subsonic_res['error'].get('code')})")
+        else: log("\nAPI Error: Unexpected response from server.")
+        return None
+
+    def latency_report(self):
+        """Returns printable lines with call counts and latencies per endpoint."""
+        lines = []
+        with self.lock: stats = sorted(self.stats.items())
+        for endpoint, (calls, failures, total, slowest) in stats:
+            lines.append(f"  {endpoint:<28} {calls:>7} calls  {failures:>5} failed  avg {total / calls * 1000:7.1f} ms  max {slowest * 1000:7.1f} ms")
+        return lines